@@ -1,23 +1,88 @@
 """Face Recognition Streamlit Application."""
-import logging
+import atexit
+import io
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
 from pathlib import Path
-from typing import TYPE_CHECKING
+from typing import TYPE_CHECKING, Final
 
 import streamlit as st
-from PIL import Image
+from PIL import Image, UnidentifiedImageError
 
 import config
-from src.utils import setup_logging, fix_image_orientation, draw_face_annotations
+from src.utils import (
+    get_logger, fix_image_orientation, draw_face_annotations, peek_image_size, get_exif_orientation
+)
 from src.database import DatabaseManager
 from src.auth import AuthManager
 
+# Refuse decompression bombs before they are decoded into memory
+Image.MAX_IMAGE_PIXELS = config.MAX_IMAGE_PIXELS
+
 # Lazy imports to avoid loading face_recognition before it's needed
 if TYPE_CHECKING:
+    import numpy as np
+    from numpy.typing import NDArray
     from src.data_manager import FaceDataManager
     from src.face_engine import FaceRecognizer
 
 
+# Static page texts, built once at import instead of on every rerun
+LOGIN_INFO_MD: Final[str] = """
+### Üdvözlünk! 👋
+
+Ez egy **arcfelismerő alkalmazás**, ahol:
+- ✅ Feltölthetsz képeket ismerősökről
+- ✅ Az app megtanulja felismerni őket
+- ✅ Később automatikusan megnevezi ki van a képen
+- ✅ Minden felhasználó saját adatbázist használ
+
+**Kezdéshez:**
+1. Regisztrálj egy új fiókot
+2. Lépj be
+3. Töltsd fel az első képeket!
+"""
+
+HOW_IT_WORKS_MD: Final[str] = """
+### Usage
+1. **Upload an image** using the uploader below
+2. Click **"Ki van a képen?"** button
+3. The app will **detect all faces** in the image
+4. **Compare** with local database
+5. **Confirm** if the recognition is correct
+
+### Privacy
+- ✅ 100% local, no cloud
+- ✅ Images stored in `data/people/` folder
+- ✅ GDPR compliant (with consent)
+
+### Supported formats
+- JPG, JPEG, PNG, BMP, GIF
+"""
+
+# Formatted with people_dir and people_dir_name
+EMPTY_DATABASE_MD: Final[str] = """
+**Lépések az adatbázis feltöltéséhez:**
+
+1. Nyisd meg a projekt mappát: `{people_dir}`
+2. Hozz létre almappákat minden személyhez (pl. `Kovacs_Janos`)
+3. Tedd a képeket az almappákba (több kép = jobb felismerés)
+4. Kattints az **"🔄 Adatbázis újraépítése"** gombra az oldalsávban
+
+**Példa struktúra:**
+```
+{people_dir_name}/
+├── Kovacs_Janos/
+│   ├── photo1.jpg
+│   └── photo2.jpg
+└── Nagy_Anna/
+    └── photo1.jpg
+```
+"""
+
+
 st.set_page_config(
     page_title=config.APP_TITLE,
     page_icon=config.APP_ICON,
@@ -26,12 +91,6 @@ st.set_page_config(
 )
 
 
-@st.cache_resource
-def get_logger() -> logging.Logger:
-    """Create and cache logger."""
-    return setup_logging()
-
-
 logger = get_logger()
 
 
@@ -50,10 +109,115 @@ def initialize_session_state() -> None:
         st.session_state.awaiting_confirmation = False
     if "recognized_faces" not in st.session_state:
         st.session_state.recognized_faces = []
-    if "current_image" not in st.session_state:
-        st.session_state.current_image = None
+    if "recognized_encodings" not in st.session_state:
+        st.session_state.recognized_encodings = []
+    if "current_image_bytes" not in st.session_state:
+        st.session_state.current_image_bytes = None
+    if "annotated_image" not in st.session_state:
+        st.session_state.annotated_image = None
     if "current_filename" not in st.session_state:
         st.session_state.current_filename = None
+    if "detailed_matches" not in st.session_state:
+        st.session_state.detailed_matches = None
+    if "save_message" not in st.session_state:
+        st.session_state.save_message = None
+        st.session_state.save_message_filename = None
+    if "save_balloons" not in st.session_state:
+        st.session_state.save_balloons = False
+
+
+def reset_recognition_state() -> None:
+    """Forget the current recognition (faces, encodings, images)."""
+    st.session_state.awaiting_confirmation = False
+    st.session_state.recognized_faces = []
+    st.session_state.recognized_encodings = []
+    st.session_state.current_image_bytes = None
+    st.session_state.annotated_image = None
+    st.session_state.current_filename = None
+    st.session_state.detailed_matches = None
+
+
+@st.cache_data(show_spinner=False, max_entries=4)
+def decode_uploaded_image(file_bytes: bytes) -> Image.Image:
+    """
+    Decode uploaded image bytes and fix orientation (cached on content).
+    
+    Full-size decodes take tens of MB each, so only the last few are kept.
+    """
+    image = Image.open(io.BytesIO(file_bytes))
+    image.load()
+    return fix_image_orientation(image)
+
+
+def shrink_for_preview(image: Image.Image) -> Image.Image:
+    """Downscale image in place so Streamlit encodes a small PNG for display."""
+    image.thumbnail((config.PREVIEW_MAX_SIDE, config.PREVIEW_MAX_SIDE), Image.LANCZOS)
+    return image
+
+
+@st.cache_data(show_spinner=False, max_entries=8)
+def read_upload_size(file_bytes: bytes) -> tuple[int, int]:
+    """
+    Read the displayed image size from the header only (cached on content).
+    
+    The whole upload is the cache key, so only the last few are kept.
+    """
+    with Image.open(io.BytesIO(file_bytes)) as image:
+        return peek_image_size(image)
+
+
+@st.cache_data(show_spinner=False, max_entries=4)
+def make_upload_preview(file_bytes: bytes) -> Image.Image:
+    """
+    Decode uploaded image bytes into a display-sized preview (cached).
+    
+    JPEGs are decoded at a reduced DCT scale via draft(), so the full-size
+    decode is only done once recognition is requested. Keyed by the whole
+    upload, so only the last few are kept.
+    """
+    image = Image.open(io.BytesIO(file_bytes))
+    image.draft("RGB", (config.PREVIEW_MAX_SIDE, config.PREVIEW_MAX_SIDE))
+    image.load()
+    return shrink_for_preview(fix_image_orientation(image))
+
+
+@st.cache_data(show_spinner=False, max_entries=32)
+def recognize_uploaded_image(
+    file_bytes: bytes,
+    user_id: int,
+    db_version: int,
+    _recognizer: "FaceRecognizer"
+) -> list[tuple[str, tuple[int, int, int, int], "NDArray[np.float64]"]]:
+    """
+    Recognize all faces in uploaded image bytes, keeping encodings (cached).
+    
+    user_id and db_version are part of the cache key so results are never
+    shared between users and are recomputed once the database changes.
+    """
+    image = decode_uploaded_image(file_bytes)
+    return _recognizer.recognize_all_faces_with_encodings(image)
+
+
+def _preload_face_models() -> None:
+    """Import the face engine, which loads the dlib models into memory."""
+    try:
+        import src.face_engine  # noqa: F401
+        logger.info("Face recognition models preloaded")
+    except Exception as e:
+        logger.error("Error preloading face recognition models: %s", str(e))
+
+
+@st.cache_resource
+def start_face_model_preload() -> threading.Thread:
+    """
+    Start loading the face recognition models in a background thread.
+    
+    Runs while the login page is shown, so initialize_face_recognition
+    finds the models already loaded (the import lock makes it wait if not).
+    """
+    thread = threading.Thread(target=_preload_face_models, name="face-model-preload", daemon=True)
+    thread.start()
+    return thread
 
 
 @st.cache_resource
@@ -64,6 +228,7 @@ def initialize_face_recognition(user_id: int) -> tuple:
     from src.face_engine import FaceRecognizer
     
     logger.info("Initializing face recognition components for user_id: %d...", user_id)
+    config.ensure_directories()
     
     data_manager = FaceDataManager(user_id=user_id, logger=logger)
     faces_count = data_manager.build_database_from_images()
@@ -77,11 +242,33 @@ def initialize_face_recognition(user_id: int) -> tuple:
     return data_manager, recognizer
 
 
+@st.cache_data(show_spinner=False)
+def get_database_info(
+    user_id: int,
+    db_version: int,
+    _data_manager: "FaceDataManager"
+) -> dict[str, int]:
+    """Get database statistics (cached until the database changes)."""
+    return _data_manager.get_database_info()
+
+
+@st.cache_resource
+def get_io_pool() -> ThreadPoolExecutor:
+    """Get shared thread pool for image saving and encoding."""
+    return ThreadPoolExecutor(
+        max_workers=min(8, os.cpu_count() or 1),
+        thread_name_prefix="face-io"
+    )
+
+
 @st.cache_resource
 def get_db_manager() -> DatabaseManager:
     """Get database manager instance."""
+    config.ensure_directories()  # SQLite file lives in data/
     db = DatabaseManager()
     db.initialize_database()
+    # Cached for the life of the process: release the pooled connections on exit
+    atexit.register(db.close)
     return db
 
 
@@ -170,20 +357,7 @@ def render_login_page(auth_manager: AuthManager) -> None:
     # Info box
     st.markdown("---")
     with st.expander("ℹ️ Információ", expanded=False):
-        st.markdown("""
-        ### Üdvözlünk! 👋
-        
-        Ez egy **arcfelismerő alkalmazás**, ahol:
-        - ✅ Feltölthetsz képeket ismerősökről
-        - ✅ Az app megtanulja felismerni őket
-        - ✅ Később automatikusan megnevezi ki van a képen
-        - ✅ Minden felhasználó saját adatbázist használ
-        
-        **Kezdéshez:**
-        1. Regisztrálj egy új fiókot
-        2. Lépj be
-        3. Töltsd fel az első képeket!
-        """)
+        st.markdown(LOGIN_INFO_MD)
 
 
 def render_sidebar(data_manager) -> None:
@@ -195,21 +369,17 @@ def render_sidebar(data_manager) -> None:
         if st.sidebar.button("🚪 Kijelentkezés", use_container_width=True):
             st.session_state.authenticated = False
             st.session_state.user = None
-            st.session_state.awaiting_confirmation = False
-            st.session_state.recognized_faces = []
-            st.session_state.current_image = None
-            st.session_state.current_filename = None
-            st.cache_resource.clear()  # Clear cached resources
+            reset_recognition_state()
+            # Free this user's face database; the shared DB and auth managers stay open
+            initialize_face_recognition.clear()
             st.rerun()
         
         st.sidebar.markdown("---")
     
     st.sidebar.title("⚙️ Beállítások")
     st.sidebar.subheader("📊 Adatbázis")
-    db_info = data_manager.get_database_info()
-    
-    st.sidebar.metric(label="Összes arc", value=db_info["total_faces"])
-    st.sidebar.metric(label="Egyedi személyek", value=db_info["unique_persons"])
+    # Filled after the actions below, so a rebuild shows fresh numbers without a rerun
+    stats_container = st.sidebar.container()
     
     st.sidebar.markdown("---")
     st.sidebar.subheader("🔄 Műveletek")
@@ -222,19 +392,22 @@ def render_sidebar(data_manager) -> None:
             if faces_count > 0:
                 st.sidebar.success(f"✅ {faces_count} arc betanítva!")
                 logger.info("Database rebuilt: %d faces", faces_count)
-                st.rerun()
             else:
                 st.sidebar.info("ℹ️ Még nincsenek képek az adatbázisban")
     
     if st.sidebar.button("🗑️ Cache törlése", use_container_width=True):
-        cache_file = data_manager.encodings_file
-        if cache_file.exists():
-            cache_file.unlink()
+        if data_manager.delete_cache_files():
             st.sidebar.success("✅ Cache törölve!")
             logger.info("Cache file deleted")
         else:
             st.sidebar.info("ℹ️ Nincs cache fájl")
     
+    db_info = get_database_info(
+        data_manager.user_id, data_manager.db_version, data_manager
+    )
+    stats_container.metric(label="Összes arc", value=db_info["total_faces"])
+    stats_container.metric(label="Egyedi személyek", value=db_info["unique_persons"])
+    
     st.sidebar.markdown("---")
     st.sidebar.info(
         f"💡 **Tipp**: Képeket a `{data_manager.people_dir}` mappába tedd, "
@@ -242,81 +415,199 @@ def render_sidebar(data_manager) -> None:
     )
 
 
+def _write_confirmed_image(
+    data_manager,
+    image_bytes: bytes,
+    save_path: Path,
+    confirmed_faces: list[tuple[str, tuple[int, int, int, int]]],
+    confirmed_encodings: list["NDArray[np.float64]"]
+) -> None:
+    """
+    Write image file to the shared folder, then add its faces (runs on the I/O pool).
+    
+    Nothing is added when the write fails, so the database never holds rows
+    for a photo that is not on disk.
+    """
+    try:
+        save_path.write_bytes(image_bytes)
+        logger.info("Saved image to %s", save_path)
+    except Exception as e:
+        logger.error("Error writing confirmed image: %s", str(e))
+        return
+    
+    try:
+        confirmed_names = [person_name for person_name, _ in confirmed_faces]
+        # One cache write for the encodings and the photo's source
+        with data_manager.batch():
+            data_manager.add_encodings(confirmed_names, confirmed_encodings, save_path)
+            data_manager.add_shared_image(save_path, confirmed_faces)
+        
+    except Exception as e:
+        logger.error("Error adding confirmed faces: %s", str(e))
+
+
+def _file_bytes_for_saving(image_bytes: bytes) -> tuple[bytes, str]:
+    """
+    Get the file content and extension to store an uploaded image with.
+    
+    Upright JPEG and PNG uploads are stored as uploaded (no re-encoding, no
+    quality loss). Other formats and EXIF-rotated photos are encoded to JPEG
+    from the orientation-fixed image, so that the stored pixels match the
+    face locations (face_recognition ignores EXIF orientation).
+    """
+    with Image.open(io.BytesIO(image_bytes)) as header:
+        image_format = header.format
+        upright = get_exif_orientation(header) == 1
+    
+    if upright and image_format == "JPEG":
+        return image_bytes, ".jpg"
+    if upright and image_format == "PNG":
+        return image_bytes, ".png"
+    
+    buffer = io.BytesIO()
+    decode_uploaded_image(image_bytes).convert("RGB").save(buffer, "JPEG", quality=92)
+    return buffer.getvalue(), ".jpg"
+
+
 def save_new_image_and_retrain(
     data_manager,
-    image: Image.Image,
+    image_bytes: bytes,
     recognized_faces: list[tuple[str, tuple[int, int, int, int]]],
+    face_encodings: list["NDArray[np.float64]"],
     original_filename: str
 ) -> bool:
     """
-    Save image to person folders and add encodings to database.
+    Save image once to the shared folder and add encodings to database.
+    
+    The encodings computed during recognition are reused as-is; the upload
+    is written to disk once in the background (re-encoded only when needed),
+    and only once it is written are the confirmed faces added to the
+    database, so the UI does not wait for file I/O.
     
     Args:
         data_manager: FaceDataManager instance
-        image: PIL Image to save
+        image_bytes: Uploaded file content
         recognized_faces: List of (name, location) tuples
+        face_encodings: Encoding of each recognized face
         original_filename: Original filename for reference
         
     Returns:
-        True if successful, False otherwise
+        True if the save was started, False otherwise
     """
     try:
-        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-        success_count = 0
-        
-        for idx, (person_name, _) in enumerate(recognized_faces):
+        confirmed_faces = []
+        confirmed_encodings = []
+        for (person_name, face_location), face_encoding in zip(recognized_faces, face_encodings):
             # Skip unknown faces
             if person_name == "Ismeretlen":
                 continue
             
-            # Create person folder if it doesn't exist (use data_manager's people_dir)
-            person_folder = data_manager.people_dir / person_name.replace(" ", "_")
-            person_folder.mkdir(parents=True, exist_ok=True)
-            
-            # Generate unique filename
-            filename = f"confirmed_{timestamp}_{idx}.jpg"
-            save_path = person_folder / filename
-            
-            # Save image
-            image.save(save_path, "JPEG")
-            logger.info("Saved image to %s", save_path)
-            
-            # Add encoding to database
-            if data_manager.add_single_image_encoding(save_path, person_name):
-                success_count += 1
-                logger.info("Added encoding for %s", person_name)
-            else:
-                logger.warning("Failed to add encoding for %s", person_name)
+            confirmed_faces.append((person_name, face_location))
+            confirmed_encodings.append(face_encoding)
+        
+        if not confirmed_encodings:
+            return False
+        
+        data_manager.shared_dir.mkdir(parents=True, exist_ok=True)
+        
+        file_bytes, extension = _file_bytes_for_saving(image_bytes)
         
-        return success_count > 0
+        # Generate unique filename
+        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S_%f")
+        save_path = data_manager.shared_dir / f"confirmed_{timestamp}{extension}"
+        
+        # Write it and add the faces in the background
+        get_io_pool().submit(
+            _write_confirmed_image,
+            data_manager,
+            file_bytes,
+            save_path,
+            confirmed_faces,
+            confirmed_encodings
+        )
+        return True
         
     except Exception as e:
         logger.error("Error saving image and retraining: %s", str(e))
         return False
 
 
+def render_confirmation(data_manager) -> None:
+    """
+    Render the Yes/No confirmation for the recognized faces.
+    
+    Part of the render_main_content fragment, so clicking a button only
+    reruns the main panel; a successful save reruns the whole app so the
+    sidebar statistics are updated.
+    """
+    if st.session_state.awaiting_confirmation and st.session_state.recognized_faces:
+        known_faces = [name for name, _ in st.session_state.recognized_faces if name != "Ismeretlen"]
+        
+        if known_faces:
+            st.markdown("---")
+            if len(known_faces) == 1:
+                st.info(f"💬 Valóban **{known_faces[0]}** van a képen?")
+            else:
+                st.info(f"💬 Valóban **{', '.join(known_faces)}** vannak a képen?")
+            
+            col_yes, col_no = st.columns(2)
+            
+            with col_yes:
+                if st.button("✅ Igen", use_container_width=True, type="primary"):
+                    if st.session_state.current_image_bytes is None or st.session_state.current_filename is None:
+                        st.error("❌ Hiba: nincs betöltött kép")
+                    else:
+                        with st.status("Képek mentése és tanulás...") as status:
+                            saved = save_new_image_and_retrain(
+                                data_manager,
+                                st.session_state.current_image_bytes,
+                                st.session_state.recognized_faces,
+                                st.session_state.recognized_encodings,
+                                st.session_state.current_filename
+                            )
+                            status.update(
+                                label="Mentés kész" if saved else "Mentés sikertelen",
+                                state="complete" if saved else "error"
+                            )
+                            
+                            if saved:
+                                # Shown above the result until another file is uploaded
+                                st.session_state.save_message = "✅ Kép elmentve és adatbázis frissítve!"
+                                st.session_state.save_message_filename = st.session_state.current_filename
+                                st.session_state.save_balloons = True
+                                logger.info("Image saved and database updated")
+                                
+                                # Clear session state
+                                reset_recognition_state()
+                                
+                                # Full rerun: the sidebar statistics are outside this fragment
+                                st.rerun(scope="app")
+                            else:
+                                st.error("❌ Hiba történt a mentés során")
+            
+            with col_no:
+                if st.button("❌ Nem", use_container_width=True):
+                    st.error("### 🤬 Szopdki ocskos, tudom hogy jól számoltam!")
+                    st.balloons()
+                    logger.info("User rejected recognition")
+                    
+                    # Clear session state
+                    reset_recognition_state()
+
+
+@st.fragment
 def render_main_content(recognizer, data_manager) -> None:
-    """Render main content (image upload, recognition)."""
+    """
+    Render main content (image upload, recognition).
+    
+    Runs as a fragment, so uploads and button clicks only rerun this panel
+    instead of the whole script (sidebar, initialization).
+    """
     st.title(config.APP_TITLE)
     st.markdown("---")
     
     with st.expander("ℹ️ How it works?", expanded=False):
-        st.markdown("""
-        ### Usage
-        1. **Upload an image** using the uploader below
-        2. Click **"Ki van a képen?"** button
-        3. The app will **detect all faces** in the image
-        4. **Compare** with local database
-        5. **Confirm** if the recognition is correct
-        
-        ### Privacy
-        - ✅ 100% local, no cloud
-        - ✅ Images stored in `data/people/` folder
-        - ✅ GDPR compliant (with consent)
-        
-        ### Supported formats
-        - JPG, JPEG, PNG, BMP, GIF
-        """)
+        st.markdown(HOW_IT_WORKS_MD)
     
     st.markdown("---")
     st.subheader("📤 Upload Image")
@@ -327,9 +618,23 @@ def render_main_content(recognizer, data_manager) -> None:
     )
     
     if uploaded_file is not None:
-        # Load and fix image orientation
-        image = Image.open(uploaded_file)
-        image = fix_image_orientation(image)
+        # The "saved" message is kept until a different file is uploaded
+        if st.session_state.save_message_filename != uploaded_file.name:
+            st.session_state.save_message = None
+        
+        # Check size before anything decodes the file
+        if uploaded_file.size > config.MAX_UPLOAD_SIZE_MB * 1024 * 1024:
+            st.error(f"❌ A fájl túl nagy (maximum {config.MAX_UPLOAD_SIZE_MB} MB)")
+            return
+        
+        # Only the header is read here, the full decode waits for recognition
+        try:
+            image_width, image_height = read_upload_size(uploaded_file.getvalue())
+            preview = make_upload_preview(uploaded_file.getvalue())
+        except (Image.DecompressionBombError, UnidentifiedImageError) as e:
+            st.error("❌ A kép nem olvasható vagy túl nagy felbontású")
+            logger.warning("Rejected upload %s: %s", uploaded_file.name, str(e))
+            return
         
         col1, col2 = st.columns([1, 1])
         
@@ -337,30 +642,39 @@ def render_main_content(recognizer, data_manager) -> None:
             st.subheader("🖼️ Uploaded Image")
             
             # Show annotated image if we have recognized faces
-            if (st.session_state.current_image is not None and 
+            if (st.session_state.annotated_image is not None and 
                 st.session_state.recognized_faces and 
                 st.session_state.current_filename == uploaded_file.name):
                 
-                annotated_image = draw_face_annotations(
-                    st.session_state.current_image,
-                    st.session_state.recognized_faces
-                )
-                st.image(annotated_image, use_column_width=True)
+                st.image(st.session_state.annotated_image)
             else:
-                st.image(image, use_column_width=True)
+                st.image(preview)
             
             st.caption(
                 f"File: {uploaded_file.name} | "
-                f"Size: {image.size[0]}x{image.size[1]} px"
+                f"Size: {image_width}x{image_height} px"
             )
         
         with col2:
             st.subheader("🔍 Result")
             
+            if st.session_state.save_message:
+                st.success(st.session_state.save_message)
+                if st.session_state.save_balloons:
+                    st.session_state.save_balloons = False
+                    st.balloons()
+            
             # Recognition button
             if st.button("🚀 Ki van a képen?", type="primary", use_container_width=True):
+                st.session_state.save_message = None
                 with st.spinner("Arcok felismerése..."):
-                    recognized_faces = recognizer.recognize_all_faces(image)
+                    recognition_results = recognize_uploaded_image(
+                        uploaded_file.getvalue(),
+                        data_manager.user_id,
+                        data_manager.db_version,
+                        recognizer
+                    )
+                    recognized_faces = [(name, location) for name, location, _ in recognition_results]
                     
                     if not recognized_faces:
                         st.warning("### ❓ Nem találtam arcot a képen")
@@ -368,13 +682,24 @@ def render_main_content(recognizer, data_manager) -> None:
                         logger.info("No faces found (file: %s)", uploaded_file.name)
                         
                         # Clear session state
-                        st.session_state.recognized_faces = []
-                        st.session_state.current_image = None
-                        st.session_state.awaiting_confirmation = False
+                        reset_recognition_state()
                     else:
+                        # Full-size decode, already cached by the recognition above
+                        image = decode_uploaded_image(uploaded_file.getvalue())
+                        
                         # Store in session state
                         st.session_state.recognized_faces = recognized_faces
-                        st.session_state.current_image = image
+                        st.session_state.recognized_encodings = [
+                            encoding for _, _, encoding in recognition_results
+                        ]
+                        # Closest matches of the previous image no longer apply
+                        st.session_state.detailed_matches = None
+                        st.session_state.current_image_bytes = uploaded_file.getvalue()
+                        # Annotate once per recognition, reruns reuse the preview.
+                        # In place: cache_data returned a copy of the decoded image
+                        st.session_state.annotated_image = shrink_for_preview(
+                            draw_face_annotations(image, recognized_faces, inplace=True)
+                        )
                         st.session_state.current_filename = uploaded_file.name
                         st.session_state.awaiting_confirmation = True
                         
@@ -392,58 +717,10 @@ def render_main_content(recognizer, data_manager) -> None:
                             st.warning(f"### ❓ {len(recognized_faces)} ismeretlen arc")
                             st.info("Ezek az arcok nincsenek az adatbázisban.")
                         
-                        st.rerun()
+                        st.rerun(scope="fragment")
             
             # Confirmation dialog
-            if st.session_state.awaiting_confirmation and st.session_state.recognized_faces:
-                known_faces = [name for name, _ in st.session_state.recognized_faces if name != "Ismeretlen"]
-                
-                if known_faces:
-                    st.markdown("---")
-                    if len(known_faces) == 1:
-                        st.info(f"💬 Valóban **{known_faces[0]}** van a képen?")
-                    else:
-                        st.info(f"💬 Valóban **{', '.join(known_faces)}** vannak a képen?")
-                    
-                    col_yes, col_no = st.columns(2)
-                    
-                    with col_yes:
-                        if st.button("✅ Igen", use_container_width=True, type="primary"):
-                            if st.session_state.current_image is None or st.session_state.current_filename is None:
-                                st.error("❌ Hiba: nincs betöltött kép")
-                            else:
-                                with st.spinner("Képek mentése és tanulás..."):
-                                    if save_new_image_and_retrain(
-                                        data_manager,
-                                        st.session_state.current_image,
-                                        st.session_state.recognized_faces,
-                                        st.session_state.current_filename
-                                    ):
-                                        st.success("✅ Kép elmentve és adatbázis frissítve!")
-                                        st.balloons()
-                                        logger.info("Image saved and database updated")
-                                        
-                                        # Clear session state
-                                        st.session_state.awaiting_confirmation = False
-                                        st.session_state.recognized_faces = []
-                                        st.session_state.current_image = None
-                                        st.session_state.current_filename = None
-                                        
-                                        st.rerun()
-                                    else:
-                                        st.error("❌ Hiba történt a mentés során")
-                    
-                    with col_no:
-                        if st.button("❌ Nem", use_container_width=True):
-                            st.error("### 🤬 Szopdki ocskos, tudom hogy jól számoltam!")
-                            st.balloons()
-                            logger.info("User rejected recognition")
-                            
-                            # Clear session state
-                            st.session_state.awaiting_confirmation = False
-                            st.session_state.recognized_faces = []
-                            st.session_state.current_image = None
-                            st.session_state.current_filename = None
+            render_confirmation(data_manager)
             
             # Detailed analysis expander
             if st.session_state.recognized_faces:
@@ -452,33 +729,35 @@ def render_main_content(recognizer, data_manager) -> None:
                     for idx, (name, location) in enumerate(st.session_state.recognized_faces, start=1):
                         top, right, bottom, left = location
                         st.markdown(f"{idx}. **{name}** (pozíció: {left}, {top} - {right}, {bottom})")
+                    
+                    # Distance scan over the whole database, only computed on request
+                    if st.checkbox("Legközelebbi egyezések mutatása", key="show_detailed_matches"):
+                        if st.session_state.detailed_matches is None:
+                            st.session_state.detailed_matches = [
+                                recognizer.get_closest_matches(face_encoding, top_n=3)
+                                for face_encoding in st.session_state.recognized_encodings
+                            ]
+                        
+                        for idx, matches in enumerate(st.session_state.detailed_matches, start=1):
+                            candidates = ", ".join(
+                                f"{name} ({distance:.3f})" for name, distance in matches
+                            )
+                            st.markdown(f"{idx}. {candidates}")
 
 
 
 def render_empty_database_warning(data_manager) -> None:
     """Show warning if database is empty."""
-    db_info = data_manager.get_database_info()
+    db_info = get_database_info(
+        data_manager.user_id, data_manager.db_version, data_manager
+    )
     
     if db_info["total_faces"] == 0:
         st.info("### ℹ️ Az adatbázis még üres")
-        st.markdown(f"""
-        **Lépések az adatbázis feltöltéséhez:**
-        
-        1. Nyisd meg a projekt mappát: `{data_manager.people_dir}`
-        2. Hozz létre almappákat minden személyhez (pl. `Kovacs_Janos`)
-        3. Tedd a képeket az almappákba (több kép = jobb felismerés)
-        4. Kattints az **"🔄 Adatbázis újraépítése"** gombra az oldalsávban
-        
-        **Példa struktúra:**
-        ```
-        {data_manager.people_dir.name}/
-        ├── Kovacs_Janos/
-        │   ├── photo1.jpg
-        │   └── photo2.jpg
-        └── Nagy_Anna/
-            └── photo1.jpg
-        ```
-        """)
+        st.markdown(EMPTY_DATABASE_MD.format(
+            people_dir=data_manager.people_dir,
+            people_dir_name=data_manager.people_dir.name
+        ))
         
         st.info(f"📁 Teljes útvonal: `{data_manager.people_dir.absolute()}`")
 
@@ -487,6 +766,7 @@ def main() -> None:
     """Application entry point."""
     try:
         initialize_session_state()
+        start_face_model_preload()
         
         # Check if user is authenticated
         if not st.session_state.authenticated or not st.session_state.user:
@@ -9,7 +9,7 @@ USERS_DIR: Final[Path] = DATA_DIR / "users"  # New: user-specific data
 PEOPLE_DIR: Final[Path] = DATA_DIR / "people"  # Legacy: for backwards compatibility
 ENCODINGS_DIR: Final[Path] = DATA_DIR / "encodings"  # Legacy: for backwards compatibility
 LOGS_DIR: Final[Path] = PROJECT_ROOT / "logs"
-ENCODINGS_FILE: Final[Path] = ENCODINGS_DIR / "face_encodings.pkl"  # Legacy
+ENCODINGS_FILE: Final[Path] = ENCODINGS_DIR / "face_encodings.npy"  # Legacy
 
 # User-specific paths (to be formatted with user_id)
 def get_user_dir(user_id: int) -> Path:
@@ -25,13 +25,16 @@ def get_user_encodings_dir(user_id: int) -> Path:
     return get_user_dir(user_id) / "encodings"
 
 def get_user_encodings_file(user_id: int) -> Path:
-    """Get user-specific face encodings file."""
-    return get_user_encodings_dir(user_id) / "face_encodings.pkl"
+    """Get user-specific face encodings file (names and metadata go to the .json next to it)."""
+    return get_user_encodings_dir(user_id) / "face_encodings.npy"
 
 # Face recognition settings
 FACE_MATCH_THRESHOLD: Final[float] = 0.6
 FACE_DETECTION_MODEL: Final[str] = "hog"
 ENCODING_MODEL: Final[str] = "small"
+QUANTIZED_INDEX: Final[bool] = False  # 8-bit FAISS index (needs faiss); candidates are re-ranked exactly
+HNSW_INDEX: Final[bool] = False  # approximate FAISS graph index (needs faiss) for large databases
+HNSW_MIN_ENCODINGS: Final[int] = 1000  # below this the exact scan is used anyway
 SUPPORTED_IMAGE_FORMATS: Final[tuple[str, ...]] = (
     ".jpg", ".jpeg", ".png", ".bmp", ".gif"
 )
@@ -45,7 +48,10 @@ LOG_DATE_FORMAT: Final[str] = "%Y-%m-%d %H:%M:%S"
 # UI settings
 APP_TITLE: Final[str] = "🎭 Face Recognition App"
 APP_ICON: Final[str] = "🎭"
-MAX_UPLOAD_SIZE_MB: Final[int] = 10
+MAX_UPLOAD_SIZE_MB: Final[int] = 10  # Keep in sync with server.maxUploadSize in .streamlit/config.toml
+MAX_IMAGE_PIXELS: Final[int] = 50_000_000  # Pillow warns above this and refuses above twice this
+PREVIEW_MAX_SIDE: Final[int] = 900  # Longest side (px) of images shown in the UI
+DETECTION_MAX_SIDE: Final[int] = 1600  # Larger images are downscaled before face detection
 
 
 def ensure_directories() -> None:
@@ -53,6 +59,3 @@ def ensure_directories() -> None:
     PEOPLE_DIR.mkdir(parents=True, exist_ok=True)
     ENCODINGS_DIR.mkdir(parents=True, exist_ok=True)
     LOGS_DIR.mkdir(parents=True, exist_ok=True)
-
-
-ensure_directories()
@@ -1,52 +1,58 @@
 """Authentication module for user management."""
-import hashlib
+import functools
+import importlib.util
 import logging
 import re
-from typing import Optional, TYPE_CHECKING
+from types import ModuleType
+from typing import Optional
 
-if TYPE_CHECKING:
-    import bcrypt as bcrypt_module
-
-try:
-    import bcrypt as bcrypt_module
-    BCRYPT_AVAILABLE = True
-except ImportError:
-    bcrypt_module = None  # type: ignore
-    BCRYPT_AVAILABLE = False
+# Checked without importing; bcrypt itself is imported on first hash/verify
+BCRYPT_AVAILABLE = importlib.util.find_spec("bcrypt") is not None
 
 from src.database import DatabaseManager
 
 
 logger = logging.getLogger(__name__)
 
+# Letters (including accented ones), digits and underscore
+_USERNAME_RE = re.compile(r"\w+")
+
+# bcrypt cost factor (2^rounds iterations): half the work of the default 12,
+# keeps logins responsive on the single Streamlit server process
+BCRYPT_ROUNDS = 11
+
+
+@functools.lru_cache(maxsize=1)
+def _get_bcrypt() -> ModuleType:
+    """Import bcrypt on first use."""
+    import bcrypt
+    return bcrypt
+
 
 class AuthManager:
     """Handle user authentication and registration."""
     
     def __init__(self, db_manager: DatabaseManager) -> None:
-        self.db = db_manager
-        self.use_bcrypt = BCRYPT_AVAILABLE
+        if not BCRYPT_AVAILABLE:
+            raise ImportError("bcrypt is required for password hashing: pip install bcrypt")
         
-        if not self.use_bcrypt:
-            logger.warning("bcrypt not available! Using fallback hashing (NOT SECURE!)")
+        self.db = db_manager
     
     def _hash_password(self, password: str) -> str:
-        """Hash password using bcrypt or fallback."""
-        if self.use_bcrypt and bcrypt_module is not None:
-            salt = bcrypt_module.gensalt()
-            hashed = bcrypt_module.hashpw(password.encode('utf-8'), salt)
-            return hashed.decode('utf-8')
-        else:
-            # FALLBACK - NOT FOR PRODUCTION!
-            return hashlib.sha256(password.encode('utf-8')).hexdigest()
+        """Hash password using bcrypt."""
+        bcrypt_module = _get_bcrypt()
+        salt = bcrypt_module.gensalt(rounds=BCRYPT_ROUNDS)
+        hashed = bcrypt_module.hashpw(password.encode('utf-8'), salt)
+        return hashed.decode('utf-8')
     
     def _verify_password(self, password: str, password_hash: str) -> bool:
         """Verify password against hash."""
-        if self.use_bcrypt and bcrypt_module is not None:
-            return bcrypt_module.checkpw(password.encode('utf-8'), password_hash.encode('utf-8'))
-        else:
-            # FALLBACK - NOT FOR PRODUCTION!
-            return hashlib.sha256(password.encode('utf-8')).hexdigest() == password_hash
+        try:
+            return _get_bcrypt().checkpw(password.encode('utf-8'), password_hash.encode('utf-8'))
+        except ValueError:
+            # Not a bcrypt hash (e.g. stored by the removed SHA-256 fallback)
+            logger.warning("Stored password hash is not a bcrypt hash")
+            return False
     
     def validate_username(self, username: str) -> tuple[bool, str]:
         """
@@ -65,7 +71,7 @@ class AuthManager:
             return False, "Felhasználónév maximum 50 karakter lehet"
         
         # Only alphanumeric and underscore
-        if not re.match(r'^\w+$', username):
+        if not _USERNAME_RE.fullmatch(username):
             return False, "Csak betűk, számok és alulvonás használható"
         
         return True, ""
@@ -1,14 +1,40 @@
+import itertools
+import json
 import logging
-import pickle
+import multiprocessing
+import os
+import sys
+import threading
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from contextlib import contextmanager
 from pathlib import Path
-from typing import Optional
+from typing import Iterator, Optional
 
+import cv2
+import dlib
 import face_recognition
+import face_recognition.api
 import numpy as np
 from numpy.typing import NDArray
+from PIL import Image
 
 import config
-from src.utils import validate_image_path, sanitize_person_name
+from src.utils import validate_image_path, sanitize_person_name, fix_image_orientation
+
+# Process-wide so versions stay unique across FaceDataManager instances
+_db_versions = itertools.count(1)
+
+# Confirmed photos are stored once in this folder of the people directory,
+# with the persons on each photo listed in its metadata file
+SHARED_DIR_NAME = "_shared"
+SHARED_METADATA_FILE = "faces.json"
+
+# Below this many images, starting worker processes costs more than it saves
+PARALLEL_BUILD_MIN_IMAGES = 8
+
+# Images loaded and passed to the CNN detector at once (all held in memory)
+CNN_DETECTION_BATCH_SIZE = 16
 
 
 def get_person_folders(people_dir: Path) -> list[Path]:
@@ -16,10 +42,109 @@ def get_person_folders(people_dir: Path) -> list[Path]:
     if not people_dir.exists():
         return []
     
-    return [
-        folder for folder in people_dir.iterdir()
-        if folder.is_dir() and not folder.name.startswith(".")
-    ]
+    # scandir entries know their type from the directory listing: no stat() per folder
+    with os.scandir(people_dir) as entries:
+        return [
+            Path(entry.path) for entry in entries
+            if entry.is_dir() and not entry.name.startswith(".") and entry.name != SHARED_DIR_NAME
+        ]
+
+
+def list_image_entries(folder: Path) -> list[os.DirEntry]:
+    """Supported image files in a folder, as os.scandir() entries."""
+    with os.scandir(folder) as entries:
+        return [entry for entry in entries if validate_image_path(entry)]
+
+
+def scan_image_files(people_dir: Path) -> dict[str, int]:
+    """Map every image in the person folders and the shared folder to its modification time (ns)."""
+    image_folders = get_person_folders(people_dir)
+    shared_dir = people_dir / SHARED_DIR_NAME
+    if shared_dir.is_dir():
+        image_folders.append(shared_dir)
+    
+    return {
+        f"{image_folder.name}/{entry.name}": entry.stat().st_mtime_ns
+        for image_folder in image_folders
+        for entry in list_image_entries(image_folder)
+    }
+
+
+def _available_cpus() -> int:
+    """CPUs this process may run on (respects affinity masks and container CPU sets)."""
+    if hasattr(os, "sched_getaffinity"):
+        return len(os.sched_getaffinity(0))
+    return os.cpu_count() or 1
+
+
+def load_image_rgb(image_path: Path) -> NDArray[np.uint8]:
+    """
+    Decode an image file into an RGB array, upright according to its EXIF orientation.
+    
+    OpenCV decodes with libjpeg-turbo straight into one array; files it cannot
+    read (GIF, non-ASCII paths on Windows) go through PIL. Uploads are
+    recognized upright too (fix_image_orientation), so both sides match.
+    """
+    image = cv2.imread(str(image_path), cv2.IMREAD_COLOR)
+    if image is None:
+        with Image.open(image_path) as pil_image:
+            return np.array(fix_image_orientation(pil_image).convert("RGB"))
+    return cv2.cvtColor(image, cv2.COLOR_BGR2RGB)
+
+
+def encode_faces(
+    image: NDArray[np.uint8],
+    face_locations: list[tuple[int, int, int, int]]
+) -> list[NDArray[np.float64]]:
+    """
+    Encode the faces at the given locations of an RGB image.
+    
+    Same result as face_recognition.face_encodings(), but all faces go
+    through dlib's encoder network in one batch instead of one call per face.
+    
+    Args:
+        image: RGB image
+        face_locations: (top, right, bottom, left) boxes
+        
+    Returns:
+        One 128-D encoding per location
+    """
+    if not face_locations:
+        return []
+    
+    if config.ENCODING_MODEL == "small":
+        pose_predictor = face_recognition.api.pose_predictor_5_point
+    else:
+        pose_predictor = face_recognition.api.pose_predictor_68_point
+    
+    landmarks = dlib.full_object_detections([
+        pose_predictor(image, dlib.rectangle(left, top, right, bottom))
+        for top, right, bottom, left in face_locations
+    ])
+    descriptors = face_recognition.api.face_encoder.compute_face_descriptor(image, landmarks, 1)
+    return [np.array(descriptor) for descriptor in descriptors]
+
+
+def _encode_image_file(
+    image_path: Path,
+    face_locations: Optional[list[tuple[int, int, int, int]]] = None
+) -> list[NDArray[np.float64]]:
+    """
+    Encode the faces of an image file (top level, so pool workers can run it).
+    
+    Faces are detected unless their locations are given.
+    """
+    image = load_image_rgb(image_path)
+    
+    if face_locations is None:
+        face_locations = face_recognition.face_locations(
+            image,
+            model=config.FACE_DETECTION_MODEL
+        )
+        if not face_locations:
+            return []
+    
+    return encode_faces(image, face_locations)
 
 
 class FaceDataManager:
@@ -34,6 +159,32 @@ class FaceDataManager:
         self.user_id = user_id
         self.known_face_encodings: list[NDArray[np.float64]] = []
         self.known_face_names: list[str] = []
+        # Faces per person; names are interned, so the list repeats one string object per person
+        self._name_counts: Counter[str] = Counter()
+        # Image each encoding came from (relative path, None if unknown)
+        self.known_face_sources: list[Optional[str]] = []
+        # Images the encodings were computed from: relative path -> mtime (ns)
+        self.source_files: dict[str, int] = {}
+        # Images that gave no encodings (unreadable, too large, shared photos without
+        # recorded faces): relative path -> mtime (ns), not retried until they change
+        self.skipped_files: dict[str, int] = {}
+        # Guards in-memory lists and cache writes (encodings may be added from worker threads)
+        self._lock = threading.RLock()
+        # Nesting depth of batch() and whether a cache save was deferred by it
+        self._batch_depth = 0
+        self._batch_dirty = False
+        # Changes on every update of the in-memory database (cache key for the UI)
+        self.db_version = next(_db_versions)
+        # db_version of the data last loaded from or saved to the cache files
+        self.cache_version: Optional[int] = None
+        # Float32 copy of the encodings: appends fill spare rows of the buffer
+        # (grown by doubling), any other change rebuilds it from the list
+        self._matrix_buffer: NDArray[np.float32] = np.empty((0, 128), dtype=np.float32)
+        self._matrix_rows = 0
+        # Matrix view and names handed out for db_version
+        self._matrix: NDArray[np.float32] = self._matrix_buffer
+        self._matrix_names: list[str] = []
+        self._matrix_version: Optional[int] = None
         
         # Set user-specific paths
         if user_id is not None:
@@ -45,29 +196,60 @@ class FaceDataManager:
             self.people_dir = config.PEOPLE_DIR
             self.encodings_file = config.ENCODINGS_FILE
             self.logger.info("FaceDataManager initialized (legacy mode)")
+        # Names and source files are stored next to the encodings matrix
+        self.metadata_file = self.encodings_file.with_suffix(".json")
+        self.shared_dir = self.people_dir / SHARED_DIR_NAME
     
     def load_encodings_from_cache(
         self,
         cache_file: Optional[Path] = None
     ) -> bool:
-        """Load encodings from cache file."""
+        """
+        Load encodings from cache files.
+        
+        The (N, 128) float32 matrix is memory-mapped, so loading does not copy
+        it; names and source files come from the .json next to it.
+        """
         if cache_file is None:
             cache_file = self.encodings_file
+        metadata_file = cache_file.with_suffix(".json")
             
-        if not cache_file.exists():
+        if not cache_file.exists() or not metadata_file.exists():
             self.logger.info("No cache file: %s", cache_file)
             return False
         
         try:
-            with open(cache_file, "rb") as file:
-                data = pickle.load(file)
+            with open(metadata_file, "r", encoding="utf-8") as file:
+                metadata = json.load(file)
+            
+            # Windows cannot replace a file that is still mapped, so read it there
+            matrix = np.load(cache_file, mmap_mode=None if os.name == "nt" else "r")
             
-            if not isinstance(data, dict):
+            if (
+                not isinstance(metadata, dict)
+                or matrix.ndim != 2
+                or matrix.shape[0] != len(metadata.get("names", []))
+            ):
                 self.logger.warning("Invalid cache format")
                 return False
             
-            self.known_face_encodings = data.get("encodings", [])
-            self.known_face_names = data.get("names", [])
+            with self._lock:
+                self.known_face_encodings = list(matrix)
+                self.known_face_names = [sys.intern(name) for name in metadata["names"]]
+                self._name_counts = Counter(self.known_face_names)
+                # Caches without per-row sources can only be rebuilt, not updated
+                sources = metadata.get("sources", [])
+                self.known_face_sources = sources if len(sources) == len(self.known_face_names) else []
+                self.source_files = metadata.get("files", {})
+                self.skipped_files = metadata.get("skipped", {})
+                self.db_version = next(_db_versions)
+                # The search can use the mapped matrix as is
+                self._matrix_buffer = matrix
+                self._matrix_rows = len(matrix)
+                self._matrix = matrix
+                self._matrix_names = list(self.known_face_names)
+                self._matrix_version = self.db_version
+                self.cache_version = self.db_version
             
             self.logger.info(
                 "Cache loaded: %d faces from %s",
@@ -84,24 +266,41 @@ class FaceDataManager:
         self,
         cache_file: Optional[Path] = None
     ) -> bool:
-        """Save encodings to cache file."""
+        """Save encodings to cache files (.npy matrix + .json names)."""
         if cache_file is None:
             cache_file = self.encodings_file
+        metadata_file = cache_file.with_suffix(".json")
             
         try:
             cache_file.parent.mkdir(parents=True, exist_ok=True)
             
-            data = {
-                "encodings": self.known_face_encodings,
-                "names": self.known_face_names,
+            with self._lock:
+                matrix, names = self.get_encodings_matrix()
+                saved_version = self._matrix_version
+            metadata = {
+                "names": names,
+                "sources": self.known_face_sources[:len(names)],
+                "files": self.source_files,
+                "skipped": self.skipped_files,
             }
             
-            with open(cache_file, "wb") as file:
-                pickle.dump(data, file)
+            # Write to temporary files and rename, so a crash never leaves a partial cache.
+            # The matrix goes first: a leftover new matrix with old names fails the row count check.
+            tmp_file = cache_file.with_name(cache_file.name + ".tmp")
+            with open(tmp_file, "wb") as file:
+                np.save(file, matrix)
+            os.replace(tmp_file, cache_file)
+            
+            tmp_file = metadata_file.with_name(metadata_file.name + ".tmp")
+            tmp_file.write_text(json.dumps(metadata, ensure_ascii=False), encoding="utf-8")
+            os.replace(tmp_file, metadata_file)
+            
+            if cache_file == self.encodings_file:
+                self.cache_version = saved_version
             
             self.logger.info(
                 "Cache saved: %d faces to %s",
-                len(self.known_face_encodings),
+                len(names),
                 cache_file.name
             )
             return True
@@ -110,105 +309,526 @@ class FaceDataManager:
             self.logger.error("Error saving cache: %s", str(e))
             return False
     
+    def delete_cache_files(self) -> bool:
+        """Delete the cache files; returns False if there was no cache."""
+        deleted = False
+        for cache_file in (self.encodings_file, self.metadata_file):
+            if cache_file.exists():
+                cache_file.unlink()
+                deleted = True
+        return deleted
+    
     def build_database_from_images(
         self,
         force_rebuild: bool = False
     ) -> int:
-        """Build face database from people directory images."""
-        if not force_rebuild and self.load_encodings_from_cache():
-            return len(self.known_face_encodings)
+        """
+        Build face database from people directory images.
         
-        self.known_face_encodings.clear()
-        self.known_face_names.clear()
+        With a usable cache only images added, changed or removed since it was
+        saved are processed; force_rebuild encodes every image again.
+        """
+        if not force_rebuild and self.load_encodings_from_cache():
+            current_files = scan_image_files(self.people_dir)
+            if self._processed_files() == current_files:
+                return len(self.known_face_encodings)
+            if len(self.known_face_sources) == len(self.known_face_encodings):
+                return self._update_changed_images(current_files)
+            self.logger.info("Images changed since cache was saved, rebuilding...")
         
         person_folders = get_person_folders(self.people_dir)
         
-        if not person_folders:
+        if not person_folders and not self.shared_dir.exists():
             self.logger.warning("No person folders found in %s", self.people_dir)
+            with self._lock:
+                self._clear()
             return 0
         
         self.logger.info("Building database from %d persons...", len(person_folders))
         
-        total_faces = 0
+        current_files = scan_image_files(self.people_dir)
+        image_jobs = self._collect_image_jobs()
+        all_encodings = self._encode_jobs(image_jobs)
         
-        for person_folder in person_folders:
-            person_name = sanitize_person_name(person_folder.name)
-            self.logger.debug("Processing: %s", person_name)
+        # Encoding ran unlocked; replacing the data and saving it must not
+        # interleave with faces added from the I/O pool
+        with self._lock:
+            self._clear()
+            total_faces = self._add_encoded_images(image_jobs, all_encodings)
+            self._record_skipped_files(current_files)
+            
+            self.logger.info(
+                "Database built: %d faces from %d persons",
+                total_faces,
+                len(self._name_counts)
+            )
+            
+            self.db_version = next(_db_versions)
+            self.save_encodings_to_cache()
+        return total_faces
+    
+    def _update_changed_images(self, current_files: dict[str, int]) -> int:
+        """
+        Bring the loaded cache up to date with the people directory.
+        
+        Rows of changed and removed images are dropped, then only the new and
+        changed images are encoded.
+        
+        Args:
+            current_files: Result of scan_image_files() for the people directory
             
-            image_files = [
-                img for img in person_folder.iterdir()
-                if validate_image_path(img)
+        Returns:
+            Number of faces in the database
+        """
+        processed_files = self._processed_files()
+        changed = {
+            path for path, mtime_ns in current_files.items()
+            if processed_files.get(path) != mtime_ns
+        }
+        removed = processed_files.keys() - current_files.keys()
+        stale = changed | removed
+        
+        self.logger.info(
+            "Updating database: %d new or changed, %d removed images",
+            len(changed),
+            len(removed)
+        )
+        
+        image_jobs = self._collect_image_jobs(changed)
+        all_encodings = self._encode_jobs(image_jobs)
+        
+        with self._lock:
+            keep = [
+                row for row, source in enumerate(self.known_face_sources)
+                if source not in stale
             ]
+            self.known_face_encodings = [self.known_face_encodings[row] for row in keep]
+            self.known_face_names = [self.known_face_names[row] for row in keep]
+            self._name_counts = Counter(self.known_face_names)
+            self.known_face_sources = [self.known_face_sources[row] for row in keep]
+            self._reset_matrix()
+            for path in stale:
+                self.source_files.pop(path, None)
+            
+            added_faces = self._add_encoded_images(image_jobs, all_encodings)
+            self._record_skipped_files(current_files)
+            
+            self.logger.info(
+                "Database updated: %d faces encoded, %d in total",
+                added_faces,
+                len(self.known_face_encodings)
+            )
+            
+            self.db_version = next(_db_versions)
+            self.save_encodings_to_cache()
+            return len(self.known_face_encodings)
+    
+    def _collect_image_jobs(
+        self,
+        only: Optional[set[str]] = None
+    ) -> list[tuple[Path, str, Optional[list[dict]]]]:
+        """
+        List the images to encode.
+        
+        Args:
+            only: Relative paths to include (None for all images)
+            
+        Returns:
+            (path, folder person name, recorded faces of shared photos or None)
+        """
+        image_jobs: list[tuple[Path, str, Optional[list[dict]]]] = []
+        
+        for person_folder in get_person_folders(self.people_dir):
+            person_name = sanitize_person_name(person_folder.name)
+            
+            image_files = [Path(entry.path) for entry in list_image_entries(person_folder)]
             
             if not image_files:
                 self.logger.warning("No images in %s folder", person_folder.name)
                 continue
             
-            for image_file in image_files:
-                faces_count = self._process_image(image_file, person_name)
-                total_faces += faces_count
+            image_jobs.extend(
+                (image_file, person_name, None) for image_file in image_files
+                if only is None or self._source_key(image_file) in only
+            )
         
-        self.logger.info(
-            "Database built: %d faces from %d persons",
-            total_faces,
-            len(set(self.known_face_names))
-        )
+        # Shared photos are encoded at their recorded locations, labeled per face
+        for filename, faces in self.load_shared_metadata().items():
+            image_path = self.shared_dir / filename
+            if not faces or not validate_image_path(image_path):
+                continue
+            if only is None or self._source_key(image_path) in only:
+                image_jobs.append((image_path, "", faces))
         
-        self.save_encodings_to_cache()
-        return total_faces
+        # OpenCV ignores Image.MAX_IMAGE_PIXELS: check the headers before decoding
+        valid_jobs = []
+        for job in image_jobs:
+            if validate_image_path(job[0], max_pixels=config.MAX_IMAGE_PIXELS):
+                valid_jobs.append(job)
+            else:
+                self.logger.warning("Skipping unreadable or too large image: %s", job[0].name)
+        
+        return valid_jobs
     
-    def _process_image(self, image_path: Path, person_name: str) -> int:
-        """Process image and extract face encoding."""
-        try:
-            image = face_recognition.load_image_file(str(image_path))
+    def _encode_jobs(
+        self,
+        image_jobs: list[tuple[Path, str, Optional[list[dict]]]]
+    ) -> list[Optional[list[NDArray[np.float64]]]]:
+        """Encode the images of _collect_image_jobs() (see _encode_images)."""
+        return self._encode_images([
+            (image_path, None if faces is None else [tuple(face["location"]) for face in faces])
+            for image_path, _, faces in image_jobs
+        ])
+    
+    def _add_encoded_images(
+        self,
+        image_jobs: list[tuple[Path, str, Optional[list[dict]]]],
+        all_encodings: list[Optional[list[NDArray[np.float64]]]]
+    ) -> int:
+        """Add the faces of encoded image jobs (call with _lock held); returns the face count."""
+        total_faces = 0
+        
+        for (image_path, person_name, faces), face_encodings in zip(image_jobs, all_encodings):
+            if face_encodings is None:
+                continue
             
-            face_locations = face_recognition.face_locations(
-                image,
-                model=config.FACE_DETECTION_MODEL
-            )
+            if faces is None:
+                face_names = [person_name] * len(face_encodings)
+            else:
+                face_names = [face["name"] for face in faces]
             
-            if not face_locations:
-                self.logger.debug("No face found in: %s", image_path.name)
-                return 0
+            source = self._source_key(image_path)
+            for face_encoding, face_name in zip(face_encodings, face_names):
+                self._append_encoding(face_encoding, face_name, source)
+            self._record_source_file(image_path)
+            total_faces += len(face_encodings)
+        
+        return total_faces
+    
+    def _encode_images(
+        self,
+        jobs: list[tuple[Path, Optional[list[tuple[int, int, int, int]]]]]
+    ) -> list[Optional[list[NDArray[np.float64]]]]:
+        """
+        Encode images, in a process pool when there are enough of them.
+        
+        Args:
+            jobs: (image path, face locations or None to detect them)
             
-            face_encodings = face_recognition.face_encodings(
-                image,
-                known_face_locations=face_locations,
-                model=config.ENCODING_MODEL
-            )
+        Returns:
+            Encodings for each job, in order; None where the image failed
+        """
+        if config.FACE_DETECTION_MODEL == "cnn":
+            # Batched in this process: worker processes would each load the CNN (and GPU context)
+            return self._encode_images_batched(jobs)
+        
+        max_workers = min(_available_cpus(), len(jobs))
+        results: list[Optional[list[NDArray[np.float64]]]] = []
+        
+        if len(jobs) < PARALLEL_BUILD_MIN_IMAGES or max_workers < 2:
+            for image_path, face_locations in jobs:
+                try:
+                    results.append(_encode_image_file(image_path, face_locations))
+                except Exception as e:
+                    self.logger.error("Error processing %s: %s", image_path.name, str(e))
+                    results.append(None)
+            return results
+        
+        self.logger.info("Encoding %d images with %d processes", len(jobs), max_workers)
+        
+        # spawn: forking the multithreaded Streamlit process is not safe
+        with ProcessPoolExecutor(
+            max_workers=max_workers,
+            mp_context=multiprocessing.get_context("spawn")
+        ) as executor:
+            futures = [
+                executor.submit(_encode_image_file, image_path, face_locations)
+                for image_path, face_locations in jobs
+            ]
             
-            for encoding in face_encodings:
-                self.known_face_encodings.append(encoding)
-                self.known_face_names.append(person_name)
+            for (image_path, _), future in zip(jobs, futures):
+                try:
+                    results.append(future.result())
+                except Exception as e:
+                    self.logger.error("Error processing %s: %s", image_path.name, str(e))
+                    results.append(None)
+        
+        return results
+    
+    def _encode_images_batched(
+        self,
+        jobs: list[tuple[Path, Optional[list[tuple[int, int, int, int]]]]]
+    ) -> list[Optional[list[NDArray[np.float64]]]]:
+        """
+        Encode images with batched CNN face detection (same arguments as _encode_images).
+        
+        face_recognition.batch_face_locations() runs the detector on several
+        images per call, which amortizes the per-call (CUDA) overhead. The next
+        chunk is decoded on a thread meanwhile (OpenCV and dlib release the GIL),
+        so at most two chunks of images are in memory.
+        """
+        results: list[Optional[list[NDArray[np.float64]]]] = []
+        chunks = [
+            jobs[start:start + CNN_DETECTION_BATCH_SIZE]
+            for start in range(0, len(jobs), CNN_DETECTION_BATCH_SIZE)
+        ]
+        if not chunks:
+            return results
+        
+        with ThreadPoolExecutor(max_workers=1) as decoder:
+            next_images = decoder.submit(self._load_images, chunks[0])
             
-            self.logger.debug(
-                "Processed: %s - %d faces",
-                image_path.name,
-                len(face_encodings)
-            )
+            for chunk_index, chunk in enumerate(chunks):
+                images = next_images.result()
+                if chunk_index + 1 < len(chunks):
+                    next_images = decoder.submit(self._load_images, chunks[chunk_index + 1])
+                
+                results.extend(self._encode_loaded_chunk(chunk, images))
+        
+        return results
+    
+    def _load_images(
+        self,
+        chunk: list[tuple[Path, Optional[list[tuple[int, int, int, int]]]]]
+    ) -> list[Optional[NDArray[np.uint8]]]:
+        """Decode the images of a chunk of jobs; None where decoding failed."""
+        images: list[Optional[NDArray[np.uint8]]] = []
+        for image_path, _ in chunk:
+            try:
+                images.append(load_image_rgb(image_path))
+            except Exception as e:
+                self.logger.error("Error processing %s: %s", image_path.name, str(e))
+                images.append(None)
+        return images
+    
+    def _encode_loaded_chunk(
+        self,
+        chunk: list[tuple[Path, Optional[list[tuple[int, int, int, int]]]]],
+        images: list[Optional[NDArray[np.uint8]]]
+    ) -> list[Optional[list[NDArray[np.float64]]]]:
+        """Detect (batched by image size) and encode the faces of decoded images."""
+        results: list[Optional[list[NDArray[np.float64]]]] = []
+        
+        # The detector batches only equally sized images
+        locations = [face_locations for _, face_locations in chunk]
+        same_size: dict[tuple[int, ...], list[int]] = {}
+        for idx, image in enumerate(images):
+            if image is not None and locations[idx] is None:
+                same_size.setdefault(image.shape, []).append(idx)
+        
+        for indices in same_size.values():
+            try:
+                batch_locations = face_recognition.batch_face_locations(
+                    [images[idx] for idx in indices],
+                    number_of_times_to_upsample=1,
+                    batch_size=len(indices)
+                )
+            except Exception as e:
+                self.logger.error("Error detecting faces in %d images: %s", len(indices), str(e))
+                for idx in indices:
+                    images[idx] = None
+                continue
             
-            return len(face_encodings)
+            for idx, face_locations in zip(indices, batch_locations):
+                locations[idx] = face_locations
+        
+        for (image_path, _), image, face_locations in zip(chunk, images, locations):
+            if image is None:
+                results.append(None)
+                continue
             
+            if not face_locations:
+                results.append([])
+                continue
+            
+            try:
+                results.append(encode_faces(image, face_locations))
+            except Exception as e:
+                self.logger.error("Error processing %s: %s", image_path.name, str(e))
+                results.append(None)
+        
+        return results
+    
+    def load_shared_metadata(self) -> dict[str, list[dict]]:
+        """
+        Load the persons recorded for the shared photos.
+        
+        Returns:
+            filename -> list of {"name": person name, "location": [top, right, bottom, left]}
+        """
+        metadata_file = self.shared_dir / SHARED_METADATA_FILE
+        if not metadata_file.exists():
+            return {}
+        
+        try:
+            with open(metadata_file, "r", encoding="utf-8") as file:
+                return json.load(file)
         except Exception as e:
-            self.logger.error(
-                "Error processing %s: %s",
-                image_path.name,
-                str(e)
-            )
-            return 0
+            self.logger.error("Error loading shared metadata: %s", str(e))
+            return {}
+    
+    def add_shared_image(
+        self,
+        image_path: Path,
+        faces: list[tuple[str, tuple[int, int, int, int]]]
+    ) -> None:
+        """
+        Record the persons on a photo written to the shared folder.
+        
+        The encodings themselves are added separately (they are already
+        computed when a recognition is confirmed); this makes rebuilds
+        label the photo the same way. Call it in the same batch() as
+        add_encodings(), so the cache is written once.
+        
+        Args:
+            image_path: Photo in the shared folder
+            faces: (person name, face location) for each confirmed face
+        """
+        with self._lock:
+            metadata = self.load_shared_metadata()
+            metadata[image_path.name] = [
+                {"name": person_name, "location": list(face_location)}
+                for person_name, face_location in faces
+            ]
+            
+            metadata_file = self.shared_dir / SHARED_METADATA_FILE
+            tmp_file = metadata_file.with_name(metadata_file.name + ".tmp")
+            tmp_file.write_text(json.dumps(metadata, ensure_ascii=False, indent=2), encoding="utf-8")
+            os.replace(tmp_file, metadata_file)
+            
+            self._record_source_file(image_path)
+            self.db_version = next(_db_versions)
+            self._save_cache_or_defer()
+    
+    @contextmanager
+    def batch(self) -> Iterator[None]:
+        """Defer cache saves until the outermost batch exits, then save once."""
+        with self._lock:
+            self._batch_depth += 1
+        try:
+            yield
+        finally:
+            with self._lock:
+                self._batch_depth -= 1
+                if self._batch_depth == 0 and self._batch_dirty:
+                    self._batch_dirty = False
+                    self.save_encodings_to_cache()
+    
+    def _save_cache_or_defer(self) -> None:
+        """Save the cache now, or at the end of the running batch."""
+        with self._lock:
+            if self._batch_depth > 0:
+                self._batch_dirty = True
+            else:
+                self.save_encodings_to_cache()
+    
+    def _source_key(self, image_path: Path) -> Optional[str]:
+        """Path of an image relative to the people directory (None if outside it)."""
+        try:
+            return image_path.relative_to(self.people_dir).as_posix()
+        except ValueError:
+            return None
+    
+    def _record_source_file(self, image_path: Path) -> None:
+        """Remember that an image from the people directory has been encoded."""
+        key = self._source_key(image_path)
+        if key is not None:
+            self.source_files[key] = image_path.stat().st_mtime_ns
+            self.skipped_files.pop(key, None)
+    
+    def _processed_files(self) -> dict[str, int]:
+        """Fingerprint of every image handled so far, encoded or skipped (compare with scan_image_files)."""
+        return {**self.skipped_files, **self.source_files}
+    
+    def _record_skipped_files(self, current_files: dict[str, int]) -> None:
+        """
+        Remember the scanned images that gave no encodings.
+        
+        Args:
+            current_files: Result of scan_image_files() taken for this build or update
+        """
+        self.skipped_files = {
+            path: mtime_ns for path, mtime_ns in current_files.items()
+            if path not in self.source_files
+        }
+    
+    def _append_encoding(
+        self,
+        face_encoding: NDArray[np.float64],
+        person_name: str,
+        source: Optional[str]
+    ) -> None:
+        """Append one face to the lists and, while it is in sync, to the float32 matrix."""
+        if self._matrix_rows == len(self.known_face_encodings):
+            if (
+                self._matrix_rows == len(self._matrix_buffer)
+                or not self._matrix_buffer.flags.writeable
+            ):
+                # Grow into a new array, so matrices handed out earlier never change
+                grown = np.empty((max(64, 2 * self._matrix_rows), 128), dtype=np.float32)
+                grown[:self._matrix_rows] = self._matrix_buffer[:self._matrix_rows]
+                self._matrix_buffer = grown
+            self._matrix_buffer[self._matrix_rows] = face_encoding
+            self._matrix_rows += 1
+        
+        person_name = sys.intern(person_name)
+        self.known_face_encodings.append(face_encoding)
+        self.known_face_names.append(person_name)
+        self._name_counts[person_name] += 1
+        self.known_face_sources.append(source)
+    
+    def _reset_matrix(self) -> None:
+        """Drop the float32 matrix after rows were removed (rebuilt on next use)."""
+        self._matrix_buffer = np.empty((0, 128), dtype=np.float32)
+        self._matrix_rows = 0
+    
+    def get_encodings_matrix(self) -> tuple[NDArray[np.float32], list[str]]:
+        """
+        Get known encodings as one C-contiguous float32 (N, 128) matrix.
+        
+        Returns:
+            (matrix, names) where names[i] belongs to matrix row i
+        """
+        with self._lock:
+            if self._matrix_version != self.db_version:
+                if self._matrix_rows != len(self.known_face_encodings):
+                    if self.known_face_encodings:
+                        self._matrix_buffer = np.ascontiguousarray(
+                            self.known_face_encodings, dtype=np.float32
+                        )
+                    else:
+                        self._matrix_buffer = np.empty((0, 128), dtype=np.float32)
+                    self._matrix_rows = len(self._matrix_buffer)
+                
+                self._matrix = self._matrix_buffer[:self._matrix_rows]
+                self._matrix_names = list(self.known_face_names)
+                self._matrix_version = self.db_version
+            
+            return self._matrix, self._matrix_names
     
     def get_database_info(self) -> dict[str, int]:
         """Get database statistics."""
         return {
             "total_faces": len(self.known_face_encodings),
-            "unique_persons": len(set(self.known_face_names))
+            "unique_persons": len(self._name_counts)
         }
     
     def clear_database(self) -> None:
         """Clear all loaded data from memory."""
+        with self._lock:
+            self._clear()
+        self.logger.info("Database cleared from memory")
+    
+    def _clear(self) -> None:
+        """Empty the lists, matrix and file records (call with _lock held)."""
         self.known_face_encodings.clear()
         self.known_face_names.clear()
-        self.logger.info("Database cleared from memory")
+        self._name_counts.clear()
+        self.known_face_sources.clear()
+        self._reset_matrix()
+        self.source_files = {}
+        self.skipped_files = {}
+        self.db_version = next(_db_versions)
     
     def add_single_image_encoding(
         self,
@@ -228,7 +848,7 @@ class FaceDataManager:
         try:
             self.logger.info("Adding encoding from %s for %s", image_path.name, person_name)
             
-            image = face_recognition.load_image_file(str(image_path))
+            image = load_image_rgb(image_path)
             
             face_locations = face_recognition.face_locations(
                 image,
@@ -239,28 +859,71 @@ class FaceDataManager:
                 self.logger.warning("No face found in %s", image_path.name)
                 return False
             
-            face_encodings = face_recognition.face_encodings(
-                image,
-                known_face_locations=face_locations,
-                model=config.ENCODING_MODEL
-            )
+            face_encodings = encode_faces(image, face_locations)
             
             if not face_encodings:
                 self.logger.warning("Failed to generate encoding for %s", image_path.name)
                 return False
             
-            # Add all encodings found in the image
-            for encoding in face_encodings:
-                self.known_face_encodings.append(encoding)
-                self.known_face_names.append(person_name)
-            
-            self.logger.info("Added %d encoding(s) for %s", len(face_encodings), person_name)
-            
-            # Save to cache
-            self.save_encodings_to_cache()
+            with self._lock:
+                # Add all encodings found in the image
+                for encoding in face_encodings:
+                    self._append_encoding(encoding, person_name, self._source_key(image_path))
+                self._record_source_file(image_path)
+                self.db_version = next(_db_versions)
+                
+                self.logger.info("Added %d encoding(s) for %s", len(face_encodings), person_name)
+                
+                # Save to cache
+                self._save_cache_or_defer()
             
             return True
             
         except Exception as e:
             self.logger.error("Error adding encoding: %s", str(e))
             return False
+    
+    def add_encoding(
+        self,
+        person_name: str,
+        face_encoding: NDArray[np.float64],
+        image_path: Optional[Path] = None
+    ) -> None:
+        """Add one already computed encoding and save the cache (unless batched)."""
+        with self._lock:
+            self._append_encoding(
+                face_encoding,
+                person_name,
+                self._source_key(image_path) if image_path is not None else None
+            )
+            self.db_version = next(_db_versions)
+            self._save_cache_or_defer()
+    
+    def add_encodings(
+        self,
+        person_names: list[str],
+        face_encodings: list[NDArray[np.float64]],
+        image_path: Optional[Path] = None
+    ) -> int:
+        """
+        Add already computed encodings to the database.
+        
+        Used for faces that were just recognized, so neither detection
+        nor encoding has to run again. The cache is written once.
+        
+        Args:
+            person_names: Name for each encoding
+            face_encodings: Encodings from FaceRecognizer.recognize_all_faces_with_encodings
+            image_path: Image in the people directory the faces are saved with
+            
+        Returns:
+            Number of encodings added
+        """
+        with self.batch():
+            for person_name, face_encoding in zip(person_names, face_encodings):
+                self.add_encoding(person_name, face_encoding, image_path)
+        
+        if face_encodings:
+            self.logger.info("Added %d precomputed encoding(s)", len(face_encodings))
+        
+        return len(face_encodings)
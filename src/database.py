@@ -2,15 +2,18 @@
 import os
 import logging
 import sqlite3
+import threading
 from typing import Optional, TYPE_CHECKING, Any
 from contextlib import contextmanager
 
 if TYPE_CHECKING:
     import psycopg2
+    import psycopg2.pool
     from psycopg2.extras import RealDictCursor
 
 try:
     import psycopg2
+    import psycopg2.pool
     from psycopg2.extras import RealDictCursor
     POSTGRES_AVAILABLE = True
 except ImportError:
@@ -21,6 +24,10 @@ except ImportError:
 
 logger = logging.getLogger(__name__)
 
+# PostgreSQL connections kept open by the pool (each thread borrows one per query)
+POOL_MIN_CONNECTIONS = 2
+POOL_MAX_CONNECTIONS = 16
+
 
 class DatabaseManager:
     """Manage database connections (PostgreSQL or SQLite fallback)."""
@@ -29,21 +36,59 @@ class DatabaseManager:
         self.db_url = os.getenv("DATABASE_URL")
         self.use_postgres = POSTGRES_AVAILABLE and self.db_url is not None
         
+        self._pool: Optional["psycopg2.pool.ThreadedConnectionPool"] = None
+        # One SQLite connection shared by all threads (Streamlit reruns each run on a
+        # new thread), reused across queries; the lock lets one transaction use it at a time
+        self._sqlite_conn: Optional[sqlite3.Connection] = None
+        self._sqlite_lock = threading.RLock()
+        
         if self.use_postgres:
             logger.info("Using PostgreSQL database")
+            # Connecting costs a TCP + TLS + auth handshake, so connections are reused
+            self._pool = psycopg2.pool.ThreadedConnectionPool(
+                POOL_MIN_CONNECTIONS,
+                POOL_MAX_CONNECTIONS,
+                self.db_url,
+                cursor_factory=RealDictCursor
+            )
         else:
             logger.info("Using SQLite database (local mode)")
             # SQLite fallback for local development
             self.sqlite_path = "data/app_database.db"
     
+    def close(self) -> None:
+        """Close the pooled PostgreSQL connections or the SQLite connection."""
+        if self._pool is not None and not self._pool.closed:
+            self._pool.closeall()
+        
+        with self._sqlite_lock:
+            if self._sqlite_conn is not None:
+                self._sqlite_conn.close()
+                self._sqlite_conn = None
+    
+    def _get_sqlite_connection(self) -> sqlite3.Connection:
+        """The shared SQLite connection (opened on first use; call with _sqlite_lock held)."""
+        if self._sqlite_conn is None:
+            # Used from whichever thread holds the lock
+            conn = sqlite3.connect(self.sqlite_path, check_same_thread=False)
+            conn.row_factory = sqlite3.Row
+            # Per-connection setting: in WAL mode, sync at checkpoints instead of every commit
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._sqlite_conn = conn
+        return self._sqlite_conn
+    
     @contextmanager
     def get_connection(self) -> Any:
         """Get database connection (context manager)."""
-        if self.use_postgres and psycopg2 is not None:
-            conn = psycopg2.connect(self.db_url, cursor_factory=RealDictCursor)
+        if self._pool is not None:
+            conn = self._pool.getconn()
         else:
-            conn = sqlite3.connect(self.sqlite_path)
-            conn.row_factory = sqlite3.Row
+            self._sqlite_lock.acquire()
+            try:
+                conn = self._get_sqlite_connection()
+            except Exception:
+                self._sqlite_lock.release()
+                raise
         
         try:
             yield conn
@@ -53,7 +98,11 @@ class DatabaseManager:
             logger.error("Database error: %s", str(e))
             raise
         finally:
-            conn.close()
+            if self._pool is not None:
+                # Broken connections are closed instead of going back to the pool
+                self._pool.putconn(conn, close=bool(conn.closed))
+            else:
+                self._sqlite_lock.release()
     
     def initialize_database(self) -> None:
         """Create tables if they don't exist."""
@@ -71,6 +120,8 @@ class DatabaseManager:
                     )
                 """)
             else:
+                # WAL (stored in the database file): readers don't block the writer
+                cursor.execute("PRAGMA journal_mode=WAL")
                 cursor.execute("""
                     CREATE TABLE IF NOT EXISTS users (
                         id INTEGER PRIMARY KEY AUTOINCREMENT,
@@ -132,5 +183,18 @@ class DatabaseManager:
     
     def user_exists(self, username: str) -> bool:
         """Check if username already exists."""
-        user = self.get_user(username)
-        return user is not None
+        try:
+            with self.get_connection() as conn:
+                cursor = conn.cursor()
+                
+                # Existence only: served from the username index without reading the row
+                if self.use_postgres:
+                    cursor.execute("SELECT 1 FROM users WHERE username = %s LIMIT 1", (username,))
+                else:
+                    cursor.execute("SELECT 1 FROM users WHERE username = ? LIMIT 1", (username,))
+                
+                return cursor.fetchone() is not None
+                
+        except Exception as e:
+            logger.error("Error checking user: %s", str(e))
+            return False
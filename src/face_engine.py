@@ -1,15 +1,47 @@
 """Face recognition engine."""
 import logging
+import os
+import threading
 from pathlib import Path
-from typing import Optional, Union
+from typing import Optional, TYPE_CHECKING, Union
 
+import cv2
 import face_recognition
 import numpy as np
 from numpy.typing import NDArray
 from PIL import Image
 
+if TYPE_CHECKING:
+    import faiss
+
+try:
+    import faiss
+    FAISS_AVAILABLE = True
+except ImportError:
+    faiss = None  # type: ignore
+    FAISS_AVAILABLE = False
+
 import config
-from src.data_manager import FaceDataManager
+from src.data_manager import FaceDataManager, encode_faces, load_image_rgb
+
+try:
+    from src.match_numba import match_batch, match_one
+    NUMBA_AVAILABLE = True
+except ImportError:
+    match_batch = match_one = None  # type: ignore
+    NUMBA_AVAILABLE = False
+
+# Candidates taken from the 8-bit index per query, then re-ranked with exact distances
+RERANK_CANDIDATES = 8
+
+# HNSW graph parameters: neighbours per node, and candidates explored per query
+HNSW_NEIGHBORS = 32
+HNSW_EF_SEARCH = 64
+
+# Rows per block when the NumPy scan looks for a single closest match, and the distance
+# below which a match is certain enough to skip the remaining blocks
+SEARCH_BLOCK_ROWS = 4096
+EARLY_EXIT_DISTANCE = 0.35
 
 
 class FaceRecognizer:
@@ -25,6 +57,23 @@ class FaceRecognizer:
         self.logger = logger or logging.getLogger(__name__)
         self.match_threshold = match_threshold
         
+        # Search structures over the known encodings, rebuilt when db_version changes:
+        # a FAISS index if faiss is installed, else squared row norms for the BLAS scan
+        self._index: Optional["faiss.Index"] = None
+        self._index_exact = True
+        self._matrix: NDArray[np.float32] = np.empty((0, 128), dtype=np.float32)
+        self._sq_norms: NDArray[np.float32] = np.empty(0, dtype=np.float32)
+        self._search_names: list[str] = []
+        self._search_version: Optional[int] = None
+        self._search_lock = threading.Lock()
+        
+        if not FAISS_AVAILABLE:
+            self.logger.info(
+                "faiss not installed, using %s distance scan",
+                "Numba" if NUMBA_AVAILABLE else "NumPy/BLAS"
+            )
+        self._refresh_search_data()
+        
         self.logger.info("FaceRecognizer initialized (threshold: %.2f)", self.match_threshold)
     
     def recognize_face(
@@ -42,6 +91,8 @@ class FaceRecognizer:
             self.logger.warning("Database is empty!")
             return None
         
+        image_array, _ = self._downscale_for_detection(image_array)
+        
         self.logger.debug("Detecting faces...")
         face_locations = face_recognition.face_locations(
             image_array,
@@ -59,18 +110,15 @@ class FaceRecognizer:
             )
         
         self.logger.debug("Generating encoding...")
-        face_encodings = face_recognition.face_encodings(
-            image_array,
-            known_face_locations=face_locations,
-            model=config.ENCODING_MODEL
-        )
+        # Only the first face is analyzed, don't run the encoder on the others
+        face_encodings = encode_faces(image_array, face_locations[:1])
         
         if not face_encodings:
             self.logger.warning("Failed to generate encoding")
             return None
         
         face_encoding = face_encodings[0]
-        recognized_name = self._match_face(face_encoding)
+        recognized_name = self._match_faces([face_encoding])[0]
         
         if recognized_name:
             self.logger.info("Face recognized: %s", recognized_name)
@@ -107,13 +155,17 @@ class FaceRecognizer:
                     self.logger.error("Image does not exist: %s", image_path)
                     return None
                 
-                return face_recognition.load_image_file(str(image_path))
+                return load_image_rgb(image_path)
             
             elif isinstance(image, Image.Image):
-                return np.array(image.convert("RGB"))
+                # convert() copies even when the mode already matches
+                if image.mode != "RGB":
+                    image = image.convert("RGB")
+                return np.array(image)
             
             elif isinstance(image, np.ndarray):
-                return image
+                # No copy when it already is a C-contiguous uint8 array
+                return np.ascontiguousarray(image, dtype=np.uint8)
             
             else:
                 self.logger.error("Unsupported image format: %s", type(image))
@@ -123,26 +175,275 @@ class FaceRecognizer:
             self.logger.error("Error loading image: %s", str(e))
             return None
     
-    def _match_face(self, face_encoding: NDArray[np.float64]) -> Optional[str]:
-        """Compare encoding with known faces."""
-        face_distances = face_recognition.face_distance(
-            self.data_manager.known_face_encodings,
-            face_encoding
-        )
+    def _downscale_for_detection(
+        self,
+        image_array: NDArray[np.uint8]
+    ) -> tuple[NDArray[np.uint8], float]:
+        """
+        Shrink large images before detection and encoding.
         
-        best_match_index = int(np.argmin(face_distances))
-        best_match_distance = face_distances[best_match_index]
+        HOG detection and encoding cost grows with the pixel count, while faces
+        in photos are found just as well at config.DETECTION_MAX_SIDE.
         
-        self.logger.debug(
-            "Best match: %s (distance: %.3f)",
-            self.data_manager.known_face_names[best_match_index],
-            best_match_distance
-        )
+        Returns:
+            (image array, scale factor applied to it)
+        """
+        height, width = image_array.shape[:2]
+        scale = config.DETECTION_MAX_SIDE / max(height, width)
+        
+        if scale >= 1.0:
+            return image_array, 1.0
+        
+        small_size = (max(1, round(width * scale)), max(1, round(height * scale)))
+        # INTER_AREA averages the covered pixels (no aliasing) and works on the array directly
+        small_array = cv2.resize(image_array, small_size, interpolation=cv2.INTER_AREA)
+        self.logger.debug("Downscaled %dx%d to %dx%d for detection", width, height, *small_size)
+        return small_array, scale
+    
+    def _refresh_search_data(self) -> None:
+        """Rebuild the search structures if the database changed since the last build."""
+        with self._search_lock:
+            db_version = self.data_manager.db_version
+            if self._search_version == db_version:
+                return
+            
+            matrix, names = self.data_manager.get_encodings_matrix()
+            
+            if FAISS_AVAILABLE and faiss is not None:
+                # Same data as the cache files: another process may have saved its index
+                cached = self.data_manager.cache_version == db_version
+                quantized = config.QUANTIZED_INDEX and len(matrix) > 0
+                hnsw = config.HNSW_INDEX and len(matrix) >= config.HNSW_MIN_ENCODINGS
+                index_file = self._index_file(quantized, hnsw)
+                index = self._read_index_file(index_file, len(names)) if cached else None
+                
+                if index is None:
+                    dimensions = matrix.shape[1]
+                    if hnsw and quantized:
+                        index = faiss.IndexHNSWSQ(
+                            dimensions, faiss.ScalarQuantizer.QT_8bit, HNSW_NEIGHBORS
+                        )
+                        index.train(matrix)
+                    elif hnsw:
+                        index = faiss.IndexHNSWFlat(dimensions, HNSW_NEIGHBORS)
+                    elif quantized:
+                        # 1 byte per dimension instead of 4, trained on the per-dimension ranges
+                        index = faiss.IndexScalarQuantizer(
+                            dimensions, faiss.ScalarQuantizer.QT_8bit, faiss.METRIC_L2
+                        )
+                        index.train(matrix)
+                    else:
+                        index = faiss.IndexFlatL2(dimensions)
+                    index.add(matrix)
+                    if cached:
+                        self._write_index_file(index_file, index)
+                
+                if hnsw:
+                    index.hnsw.efSearch = HNSW_EF_SEARCH
+                
+                self._index = index
+                self._index_exact = not quantized
+            else:
+                self._sq_norms = np.einsum("ij,ij->i", matrix, matrix)
+            
+            self._matrix = matrix
+            self._search_names = names
+            self._search_version = db_version
+            self.logger.debug("Search data built: %d encodings", len(names))
+    
+    def _index_file(self, quantized: bool, hnsw: bool) -> Path:
+        """FAISS index file stored next to the encodings cache, named after the index type."""
+        suffix = (".hnsw" if hnsw else "") + (".sq8" if quantized else "") + ".faiss"
+        return self.data_manager.encodings_file.with_suffix(suffix)
+    
+    def _read_index_file(self, index_file: Path, expected_size: int) -> Optional["faiss.Index"]:
+        """
+        Memory-map the saved FAISS index if it belongs to the current cache files.
+        
+        Processes mapping the same file share its pages instead of each
+        holding a copy of the index.
+        """
+        encodings_file = self.data_manager.encodings_file
         
-        if best_match_distance < self.match_threshold:
-            return self.data_manager.known_face_names[best_match_index]
+        try:
+            if (
+                not index_file.exists()
+                or index_file.stat().st_mtime_ns < encodings_file.stat().st_mtime_ns
+            ):
+                return None
+            
+            index = faiss.read_index(str(index_file), faiss.IO_FLAG_MMAP | faiss.IO_FLAG_READ_ONLY)
+            
+        except Exception as e:
+            self.logger.warning("Could not read FAISS index %s: %s", index_file.name, str(e))
+            return None
         
-        return None
+        if index.ntotal != expected_size:
+            return None
+        
+        self.logger.info("FAISS index loaded: %d encodings from %s", index.ntotal, index_file.name)
+        return index
+    
+    def _write_index_file(self, index_file: Path, index: "faiss.Index") -> None:
+        """Save the FAISS index next to the encodings cache (atomically)."""
+        tmp_file = index_file.with_name(index_file.name + ".tmp")
+        
+        try:
+            faiss.write_index(index, str(tmp_file))
+            os.replace(tmp_file, index_file)
+        except Exception as e:
+            self.logger.warning("Could not save FAISS index %s: %s", index_file.name, str(e))
+    
+    def _search(
+        self,
+        face_encodings: list[NDArray[np.float64]],
+        k: int
+    ) -> tuple[NDArray[np.float32], NDArray[np.int64], list[str]]:
+        """
+        Find the k nearest known encodings for each query encoding.
+        
+        Returns:
+            (squared distances, indices), both shaped (queries, k),
+            and the names the indices refer to
+        """
+        self._refresh_search_data()
+        with self._search_lock:
+            index, matrix, sq_norms, names = self._index, self._matrix, self._sq_norms, self._search_names
+            index_exact = self._index_exact
+        
+        queries = np.ascontiguousarray(face_encodings, dtype=np.float32)
+        k = min(k, len(names))
+        
+        if index is not None and index_exact:
+            # Flat and HNSW indexes both return squared Euclidean distances
+            distances_sq, indices = index.search(queries, k)
+            return distances_sq, indices, names
+        
+        if index is not None:
+            # 8-bit codes only approximate distances, so re-rank the best candidates exactly
+            # to keep the match threshold exact
+            _, candidates = index.search(queries, min(max(k, RERANK_CANDIDATES), len(names)))
+            differences = matrix[candidates] - queries[:, np.newaxis, :]
+            distances_sq = np.einsum("qcd,qcd->qc", differences, differences)
+            # HNSW pads with -1 when it finds fewer candidates; matrix[-1] is a real row
+            distances_sq[candidates < 0] = np.inf
+            order = np.argsort(distances_sq, axis=1)[:, :k]
+            return (
+                np.take_along_axis(distances_sq, order, axis=1),
+                np.take_along_axis(candidates, order, axis=1),
+                names
+            )
+        
+        if k == 1 and match_one is not None and len(queries) == 1:
+            best_index, best_distance_sq = match_one(matrix, queries[0])
+            return (
+                np.array([[best_distance_sq]], dtype=np.float32),
+                np.array([[best_index]], dtype=np.int64),
+                names
+            )
+        
+        if k == 1 and match_batch is not None:
+            best_indices = np.empty(len(queries), dtype=np.int64)
+            best_distances_sq = np.empty(len(queries), dtype=np.float32)
+            # The kernels are compiled for read-only (memory-mapped cache) and writable matrices
+            match_batch(matrix, queries, best_indices, best_distances_sq)
+            return best_distances_sq[:, np.newaxis], best_indices[:, np.newaxis], names
+        
+        query_sq_norms = np.einsum("ij,ij->i", queries, queries)[:, np.newaxis]
+        
+        if k == 1 and len(names) > SEARCH_BLOCK_ROWS:
+            return (*self._closest_blockwise(queries, query_sq_norms, matrix, sq_norms), names)
+        
+        distances_sq = self._distances_sq(queries, query_sq_norms, matrix, sq_norms)
+        
+        if k == 1:
+            indices = np.argmin(distances_sq, axis=1)[:, np.newaxis]
+        elif k < distances_sq.shape[1]:
+            # O(N) selection of the k closest, then only those k are sorted
+            indices = np.argpartition(distances_sq, k - 1, axis=1)[:, :k]
+            order = np.argsort(np.take_along_axis(distances_sq, indices, axis=1), axis=1)
+            indices = np.take_along_axis(indices, order, axis=1)
+        else:
+            indices = np.argsort(distances_sq, axis=1)
+        
+        return np.take_along_axis(distances_sq, indices, axis=1), indices, names
+    
+    @staticmethod
+    def _distances_sq(
+        queries: NDArray[np.float32],
+        query_sq_norms: NDArray[np.float32],
+        matrix: NDArray[np.float32],
+        sq_norms: NDArray[np.float32]
+    ) -> NDArray[np.float32]:
+        """Squared Euclidean distances, shaped (queries, rows of matrix)."""
+        # ||known - query||^2 = ||known||^2 - 2 known.query + ||query||^2, one GEMM for all queries
+        distances_sq = queries @ matrix.T
+        distances_sq *= -2.0
+        distances_sq += sq_norms
+        distances_sq += query_sq_norms
+        np.maximum(distances_sq, 0.0, out=distances_sq)
+        return distances_sq
+    
+    def _closest_blockwise(
+        self,
+        queries: NDArray[np.float32],
+        query_sq_norms: NDArray[np.float32],
+        matrix: NDArray[np.float32],
+        sq_norms: NDArray[np.float32]
+    ) -> tuple[NDArray[np.float32], NDArray[np.int64]]:
+        """
+        Closest known encoding per query, scanning the matrix in blocks.
+        
+        Stops early once every query has a match closer than EARLY_EXIT_DISTANCE,
+        so confident matches don't pay for the rest of the database.
+        
+        Returns:
+            (squared distances, indices), both shaped (queries, 1)
+        """
+        best_distances_sq = np.full(len(queries), np.inf, dtype=np.float32)
+        best_indices = np.zeros(len(queries), dtype=np.int64)
+        early_exit_sq = EARLY_EXIT_DISTANCE ** 2
+        
+        for start in range(0, len(matrix), SEARCH_BLOCK_ROWS):
+            stop = start + SEARCH_BLOCK_ROWS
+            distances_sq = self._distances_sq(
+                queries, query_sq_norms, matrix[start:stop], sq_norms[start:stop]
+            )
+            block_indices = np.argmin(distances_sq, axis=1)
+            block_distances_sq = distances_sq[np.arange(len(queries)), block_indices]
+            
+            closer = block_distances_sq < best_distances_sq
+            best_distances_sq[closer] = block_distances_sq[closer]
+            best_indices[closer] = block_indices[closer] + start
+            
+            if np.all(best_distances_sq < early_exit_sq):
+                self.logger.debug("Early exit after %d of %d encodings", min(stop, len(matrix)), len(matrix))
+                break
+        
+        return best_distances_sq[:, np.newaxis], best_indices[:, np.newaxis]
+    
+    def _match_faces(
+        self,
+        face_encodings: list[NDArray[np.float64]]
+    ) -> list[Optional[str]]:
+        """Match several encodings against the known faces at once."""
+        distances_sq, indices, known_names = self._search(face_encodings, 1)
+        threshold_sq = self.match_threshold ** 2
+        
+        # The distance for the debug log needs a sqrt per face: skip it unless DEBUG is on
+        if self.logger.isEnabledFor(logging.DEBUG):
+            for distance_sq, best_match_index in zip(distances_sq[:, 0], indices[:, 0]):
+                self.logger.debug(
+                    "Best match: %s (distance: %.3f)",
+                    known_names[best_match_index] if best_match_index >= 0 else None,
+                    float(np.sqrt(distance_sq))
+                )
+        
+        # -1: no known encoding (empty matrix, or padding of a FAISS search)
+        return [
+            known_names[best_match_index] if best_match_index >= 0 and distance_sq < threshold_sq else None
+            for distance_sq, best_match_index in zip(distances_sq[:, 0].tolist(), indices[:, 0].tolist())
+        ]
     
     def get_detailed_match_results(
         self,
@@ -155,6 +456,8 @@ class FaceRecognizer:
         if image_array is None or not self.data_manager.known_face_encodings:
             return []
         
+        image_array, _ = self._downscale_for_detection(image_array)
+        
         face_locations = face_recognition.face_locations(
             image_array,
             model=config.FACE_DETECTION_MODEL
@@ -163,24 +466,28 @@ class FaceRecognizer:
         if not face_locations:
             return []
         
-        face_encodings = face_recognition.face_encodings(
-            image_array,
-            known_face_locations=face_locations,
-            model=config.ENCODING_MODEL
-        )
+        face_encodings = encode_faces(image_array, face_locations[:1])
         
         if not face_encodings:
             return []
         
-        face_encoding = face_encodings[0]
-        face_distances = face_recognition.face_distance(
-            self.data_manager.known_face_encodings,
-            face_encoding
-        )
+        return self.get_closest_matches(face_encodings[0], top_n=top_n)
+    
+    def get_closest_matches(
+        self,
+        face_encoding: NDArray[np.float64],
+        top_n: int = 3
+    ) -> list[tuple[str, float]]:
+        """Get the closest known faces for an already computed encoding."""
+        if not self.data_manager.known_face_encodings:
+            return []
         
-        results = list(zip(self.data_manager.known_face_names, face_distances))
-        results.sort(key=lambda x: x[1])
-        return results[:top_n]
+        distances_sq, indices, known_names = self._search([face_encoding], top_n)
+        return [
+            (known_names[match_index], distance)
+            for distance, match_index in zip(np.sqrt(distances_sq[0]).tolist(), indices[0].tolist())
+            if match_index >= 0  # FAISS pads missing results with -1
+        ]
     
     def recognize_all_faces(
         self,
@@ -193,6 +500,22 @@ class FaceRecognizer:
             List of tuples: (name, face_location)
             face_location is (top, right, bottom, left)
         """
+        return [
+            (name, face_location)
+            for name, face_location, _ in self.recognize_all_faces_with_encodings(image)
+        ]
+    
+    def recognize_all_faces_with_encodings(
+        self,
+        image: Union[str, Path, NDArray[np.uint8], Image.Image]
+    ) -> list[tuple[str, tuple[int, int, int, int], NDArray[np.float64]]]:
+        """
+        Recognize all faces in an image and keep their encodings.
+        
+        Returns:
+            List of tuples: (name, face_location, face_encoding)
+            face_location is (top, right, bottom, left)
+        """
         image_array = self._load_and_normalize_image(image)
         
         if image_array is None:
@@ -203,6 +526,8 @@ class FaceRecognizer:
             self.logger.warning("Database is empty!")
             return []
         
+        image_array, scale = self._downscale_for_detection(image_array)
+        
         self.logger.debug("Detecting all faces...")
         face_locations = face_recognition.face_locations(
             image_array,
@@ -216,22 +541,29 @@ class FaceRecognizer:
         self.logger.info("Found %d face(s) in image", len(face_locations))
         
         self.logger.debug("Generating encodings for all faces...")
-        face_encodings = face_recognition.face_encodings(
-            image_array,
-            known_face_locations=face_locations,
-            model=config.ENCODING_MODEL
-        )
+        # One call for all detected locations
+        face_encodings = encode_faces(image_array, face_locations)
         
         if not face_encodings:
             self.logger.warning("Failed to generate encodings")
             return []
         
-        # Match each face
+        # Match all faces at once
+        recognized_names = self._match_faces(face_encodings)
+        
+        # Report locations in the coordinates of the original image
+        if scale != 1.0:
+            face_locations = [
+                tuple(int(round(coordinate / scale)) for coordinate in face_location)
+                for face_location in face_locations
+            ]
+        
         results = []
-        for face_encoding, face_location in zip(face_encodings, face_locations):
-            recognized_name = self._match_face(face_encoding)
+        for face_encoding, face_location, recognized_name in zip(
+            face_encodings, face_locations, recognized_names
+        ):
             name = recognized_name if recognized_name else "Ismeretlen"
-            results.append((name, face_location))
+            results.append((name, face_location, face_encoding))
             self.logger.debug("Face at %s: %s", face_location, name)
         
         return results
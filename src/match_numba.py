@@ -0,0 +1,128 @@
+"""Numba-compiled nearest-neighbour search (used when faiss is not installed)."""
+import numpy as np
+from numba import get_num_threads, njit, prange, types
+from numpy.typing import NDArray
+
+
+# The known encodings are read-only when they are the memory-mapped cache
+# (np.load(mmap_mode="r")) and writable when built in memory, so both are compiled
+_KNOWN_TYPES = (
+    types.Array(types.float32, 2, "C", readonly=True),
+    types.Array(types.float32, 2, "C")
+)
+_QUERIES_TYPE = types.Array(types.float32, 2, "C")
+_QUERY_TYPE = types.Array(types.float32, 1, "C")
+
+# fastmath=True minus "nnan" and "ninf": the running minimum starts at (and an
+# empty matrix returns) np.inf, and comparisons with inf are undefined under ninf
+_FASTMATH = {"nsz", "arcp", "contract", "afn", "reassoc"}
+
+
+# Explicit signatures: compiled when this module is imported (and cached on disk),
+# not on the first recognition
+@njit(
+    [
+        types.void(
+            known,
+            _QUERIES_TYPE,
+            types.Array(types.int64, 1, "C"),
+            types.Array(types.float32, 1, "C")
+        )
+        for known in _KNOWN_TYPES
+    ],
+    parallel=True,
+    fastmath=_FASTMATH,
+    cache=True
+)
+def match_batch(
+    known: NDArray[np.float32],
+    queries: NDArray[np.float32],
+    out_indices: NDArray[np.int64],
+    out_distances_sq: NDArray[np.float32]
+) -> None:
+    """
+    Find the closest known encoding for every query encoding.
+    
+    Args:
+        known: (N, D) known encodings
+        queries: (Q, D) query encodings
+        out_indices: (Q,) filled with the index of the closest known encoding
+        out_distances_sq: (Q,) filled with its squared Euclidean distance
+    """
+    for q in prange(queries.shape[0]):
+        best_distance_sq = np.inf
+        best_index = -1
+        
+        for k in range(known.shape[0]):
+            distance_sq = 0.0
+            for j in range(known.shape[1]):
+                difference = known[k, j] - queries[q, j]
+                distance_sq += difference * difference
+            
+            if distance_sq < best_distance_sq:
+                best_distance_sq = distance_sq
+                best_index = k
+        
+        out_indices[q] = best_index
+        out_distances_sq[q] = best_distance_sq
+
+
+@njit(
+    [
+        types.Tuple((types.int64, types.float32))(known, _QUERY_TYPE, types.int64)
+        for known in _KNOWN_TYPES
+    ],
+    parallel=True,
+    fastmath=_FASTMATH,
+    cache=True
+)
+def _match_one_chunked(
+    known: NDArray[np.float32],
+    query: NDArray[np.float32],
+    chunks: int
+) -> tuple[int, float]:
+    """Closest known encoding for one query, scanning `chunks` row ranges in parallel."""
+    rows = known.shape[0]
+    chunks = min(chunks, rows)
+    if chunks <= 0:
+        return -1, np.float32(np.inf)
+    
+    chunk_best_indices = np.full(chunks, -1, dtype=np.int64)
+    chunk_best_distances_sq = np.full(chunks, np.inf, dtype=np.float32)
+    
+    for c in prange(chunks):
+        best_distance_sq = np.inf
+        best_index = -1
+        
+        for k in range(c * rows // chunks, (c + 1) * rows // chunks):
+            distance_sq = 0.0
+            for j in range(known.shape[1]):
+                difference = known[k, j] - query[j]
+                distance_sq += difference * difference
+            
+            if distance_sq < best_distance_sq:
+                best_distance_sq = distance_sq
+                best_index = k
+        
+        chunk_best_indices[c] = best_index
+        chunk_best_distances_sq[c] = best_distance_sq
+    
+    best = np.argmin(chunk_best_distances_sq)
+    return chunk_best_indices[best], chunk_best_distances_sq[best]
+
+
+def match_one(
+    known: NDArray[np.float32],
+    query: NDArray[np.float32]
+) -> tuple[int, float]:
+    """
+    Find the closest known encoding for a single query encoding.
+    
+    match_batch parallelises over queries, which leaves one thread busy for a
+    single face; this splits the known encodings across threads instead.
+    
+    Returns:
+        (index of the closest known encoding, its squared Euclidean distance)
+    """
+    # Read here rather than inside the kernel, which keeps it cacheable on disk
+    return _match_one_chunked(known, query, get_num_threads())
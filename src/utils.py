@@ -1,12 +1,37 @@
 """Utility functions."""
+import atexit
+import functools
 import logging
+import logging.handlers
+import os
+import queue
 from pathlib import Path
-from typing import Optional, cast
+from typing import Optional, TYPE_CHECKING, Union, cast
 
-from PIL import Image, ImageOps, ImageDraw, ImageFont
+from PIL import Image, ImageOps
+
+if TYPE_CHECKING:
+    from PIL import ImageFont
 
 import config
 
+# Annotation color palette, cycled per face
+FACE_COLORS: tuple[tuple[int, int, int], ...] = (
+    (0, 255, 0),      # Green
+    (0, 0, 255),      # Blue
+    (255, 105, 180),  # Pink
+    (255, 215, 0),    # Gold
+    (255, 0, 0),      # Red
+    (138, 43, 226)    # Purple
+)
+
+# Annotation layout (pixels): face box -> gap -> arrow -> gap -> label
+ARROW_GAP = 10
+ARROW_LENGTH = 50
+ARROW_HEAD_SIZE = 8
+LABEL_GAP = 10
+LABEL_PADDING = 4
+
 
 def setup_logging(
     log_level: str = config.LOG_LEVEL,
@@ -14,6 +39,11 @@ def setup_logging(
 ) -> logging.Logger:
     """Configure application logging."""
     logger = logging.getLogger("FaceRecognitionApp")
+    
+    # Already configured in this process (e.g. Streamlit re-executed the script)
+    if logger.handlers:
+        return logger
+    
     logger.setLevel(getattr(logging, log_level.upper()))
     
     formatter = logging.Formatter(
@@ -23,27 +53,64 @@ def setup_logging(
     
     console_handler = logging.StreamHandler()
     console_handler.setFormatter(formatter)
-    logger.addHandler(console_handler)
+    handlers: list[logging.Handler] = [console_handler]
     
     if log_file:
         log_file.parent.mkdir(parents=True, exist_ok=True)
-        file_handler = logging.FileHandler(log_file, encoding="utf-8")
+        # delay: the file is only created once something is logged
+        file_handler = logging.FileHandler(log_file, encoding="utf-8", delay=True)
         file_handler.setFormatter(formatter)
-        logger.addHandler(file_handler)
+        handlers.append(file_handler)
+    
+    # Logging calls only enqueue the record; a background thread does the writes
+    log_queue: queue.SimpleQueue[logging.LogRecord] = queue.SimpleQueue()
+    logger.addHandler(logging.handlers.QueueHandler(log_queue))
+    listener = logging.handlers.QueueListener(log_queue, *handlers)
+    listener.start()
+    # Flush the queued records on exit
+    atexit.register(listener.stop)
     
     logger.info("Logging initialized at %s level", log_level)
     return logger
 
 
-def validate_image_path(image_path: Path) -> bool:
-    """Check if image file is valid and supported."""
-    if not image_path.exists():
-        return False
+@functools.lru_cache(maxsize=1)
+def get_logger() -> logging.Logger:
+    """Get the application logger, configured once per process."""
+    return setup_logging()
+
+
+def validate_image_path(
+    image_path: Union[Path, os.DirEntry],
+    verify: bool = False,
+    max_pixels: Optional[int] = None
+) -> bool:
+    """
+    Check if image file is valid and supported.
     
-    if not image_path.is_file():
+    The extension is checked first, without touching the filesystem; for
+    os.scandir() entries is_file() uses the type the directory listing returned.
+    
+    Args:
+        image_path: Image file path or os.scandir() entry
+        verify: Also check the file's integrity with PIL's verify()
+        max_pixels: Reject images with more pixels (read from the header only)
+    """
+    if not image_path.name.lower().endswith(config.SUPPORTED_IMAGE_FORMATS):
         return False
     
-    if image_path.suffix.lower() not in config.SUPPORTED_IMAGE_FORMATS:
+    try:
+        if not image_path.is_file():
+            return False
+        
+        if verify or max_pixels is not None:
+            # Image.open only parses the header, pixels are not decoded
+            with Image.open(os.fspath(image_path)) as image:
+                if max_pixels is not None and image.width * image.height > max_pixels:
+                    return False
+                if verify:
+                    image.verify()
+    except Exception:
         return False
     
     return True
@@ -51,13 +118,15 @@ def validate_image_path(image_path: Path) -> bool:
 
 def sanitize_person_name(folder_name: str) -> str:
     """Convert folder name to readable person name."""
-    name = folder_name.replace("_", " ")
-    name = name.title()
-    return name
+    return folder_name.replace("_", " ").title()
 
 
 def fix_image_orientation(image: Image.Image) -> Image.Image:
     """Fix image orientation based on EXIF data."""
+    # Upright: exif_transpose would return a full copy of the pixels
+    if get_exif_orientation(image) == 1:
+        return image
+    
     try:
         # Use ImageOps.exif_transpose to handle EXIF orientation
         result = ImageOps.exif_transpose(image)
@@ -67,9 +136,82 @@ def fix_image_orientation(image: Image.Image) -> Image.Image:
         return image
 
 
+def get_exif_orientation(image: Image.Image) -> int:
+    """Get the EXIF orientation (1 = upright) without decoding the pixels."""
+    try:
+        return int(image.getexif().get(0x0112, 1))  # EXIF Orientation tag
+    except Exception:
+        return 1
+
+
+def peek_image_size(image: Image.Image) -> tuple[int, int]:
+    """
+    Get the displayed (width, height) of an opened but not yet loaded image.
+    
+    Only the header and EXIF are read, pixels are not decoded. Orientations
+    5-8 are 90 degree rotations, so width and height are swapped for them.
+    """
+    width, height = image.size
+    
+    if get_exif_orientation(image) in (5, 6, 7, 8):
+        return height, width
+    return width, height
+
+
+@functools.lru_cache(maxsize=32)
+def _get_font(
+    size: int
+) -> tuple[Union["ImageFont.FreeTypeFont", "ImageFont.ImageFont"], int]:
+    """
+    Load the label font once per size.
+    
+    Returns:
+        (font, its size); the default font (size 10) if arial.ttf is not available
+    """
+    # Imported on first use: database build workers import this module but never draw
+    from PIL import ImageFont
+    
+    try:
+        return ImageFont.truetype("arial.ttf", size), size
+    except Exception:
+        return ImageFont.load_default(), 10
+
+
+@functools.lru_cache(maxsize=256)
+def _render_label(
+    text: str,
+    font_size: int,
+    color: tuple[int, int, int]
+) -> tuple[Image.Image, tuple[int, int]]:
+    """
+    Render a label once: colored text on a black background with LABEL_PADDING.
+    
+    Names repeat across images, so later annotations only paste the tile.
+    
+    Returns:
+        (RGB tile, offset of the tile from the text position)
+    """
+    from PIL import ImageDraw
+    
+    font = _get_font(font_size)[0]
+    left, top, right, bottom = (int(value) for value in font.getbbox(text))
+    
+    tile = Image.new(
+        "RGB",
+        # +1: same size as the inclusive draw.rectangle background it replaces
+        (right - left + 2 * LABEL_PADDING + 1, bottom - top + 2 * LABEL_PADDING + 1),
+        (0, 0, 0)
+    )
+    ImageDraw.Draw(tile).text(
+        (LABEL_PADDING - left, LABEL_PADDING - top), text, fill=color, font=font
+    )
+    return tile, (left - LABEL_PADDING, top - LABEL_PADDING)
+
+
 def draw_face_annotations(
     image: Image.Image,
-    recognized_faces: list[tuple[str, tuple[int, int, int, int]]]
+    recognized_faces: list[tuple[str, tuple[int, int, int, int]]],
+    inplace: bool = False
 ) -> Image.Image:
     """
     Draw colored rectangles, arrows and names for recognized faces.
@@ -77,87 +219,49 @@ def draw_face_annotations(
     Args:
         image: PIL Image
         recognized_faces: List of (name, (top, right, bottom, left))
+        inplace: Draw on image itself instead of a copy
     
     Returns:
         Annotated PIL Image
     """
-    # Color palette (6 colors cycle)
-    colors = [
-        (0, 255, 0),      # Green
-        (0, 0, 255),      # Blue
-        (255, 105, 180),  # Pink
-        (255, 215, 0),    # Gold
-        (255, 0, 0),      # Red
-        (138, 43, 226)    # Purple
-    ]
-    
-    img_copy = cast(Image.Image, image.copy())
-    draw = ImageDraw.Draw(img_copy)
-    
-    # Try to load a font, fall back to default if not available
-    font_size = 0  # Initialize before try block
-    try:
-        font_size = max(20, min(img_copy.height, img_copy.width) // 30)
-        font = ImageFont.truetype("arial.ttf", font_size)
-    except Exception:
-        font = ImageFont.load_default()
-        font_size = 10
+    from PIL import ImageDraw
+    
+    annotated = image if inplace else cast(Image.Image, image.copy())
+    draw = ImageDraw.Draw(annotated)
+    
+    requested_font_size = max(20, min(annotated.height, annotated.width) // 30)
+    font_size = _get_font(requested_font_size)[1]
     
     for idx, (name, face_location) in enumerate(recognized_faces):
         top, right, bottom, left = face_location
-        color = colors[idx % len(colors)]
-        
-        # Draw rectangle around face (3px thick)
-        for offset in range(3):
-            draw.rectangle(
-                [(left - offset, top - offset), (right + offset, bottom + offset)],
-                outline=color
-            )
+        color = FACE_COLORS[idx % len(FACE_COLORS)]
         
-        # Calculate arrow position (from right side of face)
-        arrow_start_x = right + 10
-        arrow_start_y = (top + bottom) // 2
-        arrow_end_x = arrow_start_x + 50
-        arrow_end_y = arrow_start_y
-        
-        # Draw arrow line
-        draw.line(
-            [(arrow_start_x, arrow_start_y), (arrow_end_x, arrow_end_y)],
-            fill=color,
-            width=2
+        # Draw rectangle around face (3px thick, growing outwards from the face box)
+        draw.rectangle(
+            [(left - 2, top - 2), (right + 2, bottom + 2)],
+            outline=color,
+            width=3
         )
         
-        # Draw arrow head
-        arrow_size = 8
+        # Arrow from the right side of the face, at its vertical center
+        arrow_y = (top + bottom) // 2
+        arrow_end_x = right + ARROW_GAP + ARROW_LENGTH
+        
+        draw.line([(right + ARROW_GAP, arrow_y), (arrow_end_x, arrow_y)], fill=color, width=2)
         draw.polygon(
             [
-                (arrow_end_x, arrow_end_y),
-                (arrow_end_x - arrow_size, arrow_end_y - arrow_size),
-                (arrow_end_x - arrow_size, arrow_end_y + arrow_size)
+                (arrow_end_x, arrow_y),
+                (arrow_end_x - ARROW_HEAD_SIZE, arrow_y - ARROW_HEAD_SIZE),
+                (arrow_end_x - ARROW_HEAD_SIZE, arrow_y + ARROW_HEAD_SIZE)
             ],
             fill=color
         )
         
-        # Draw name with black background
-        text_x = arrow_end_x + 10
-        text_y = arrow_end_y - font_size // 2
-        
-        # Get text bounding box
-        bbox = draw.textbbox((text_x, text_y), name, font=font)
-        text_width = bbox[2] - bbox[0]
-        text_height = bbox[3] - bbox[1]
-        
-        # Draw black background rectangle
-        padding = 4
-        draw.rectangle(
-            [
-                (text_x - padding, text_y - padding),
-                (text_x + text_width + padding, text_y + text_height + padding)
-            ],
-            fill=(0, 0, 0)
-        )
+        # Name with black background, placed by the glyphs' actual bounding box
+        text_x = arrow_end_x + LABEL_GAP
+        text_y = arrow_y - font_size // 2
         
-        # Draw text
-        draw.text((text_x, text_y), name, fill=color, font=font)
+        label, (offset_x, offset_y) = _render_label(name, requested_font_size, color)
+        annotated.paste(label, (text_x + offset_x, text_y + offset_y))
     
-    return img_copy
+    return annotated
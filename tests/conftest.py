@@ -0,0 +1,5 @@
+"""Make the app modules (config, src) importable when running `pytest tests/`."""
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
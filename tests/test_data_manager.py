@@ -0,0 +1,177 @@
+"""Incremental database builds."""
+import os
+from pathlib import Path
+from typing import Optional
+
+import numpy as np
+import pytest
+from PIL import Image
+
+data_manager = pytest.importorskip("src.data_manager")
+
+
+def _manager(root: Path) -> "data_manager.FaceDataManager":
+    manager = data_manager.FaceDataManager()
+    manager.people_dir = root / "people"
+    manager.shared_dir = manager.people_dir / data_manager.SHARED_DIR_NAME
+    manager.encodings_file = root / "encodings" / "face_encodings.npy"
+    manager.metadata_file = manager.encodings_file.with_suffix(".json")
+    return manager
+
+
+@pytest.fixture
+def people_dir(tmp_path: Path) -> Path:
+    person_dir = tmp_path / "people" / "Kovacs_Eva"
+    person_dir.mkdir(parents=True)
+    # No face in it: encoded, gives no encodings
+    Image.new("RGB", (64, 64), (128, 128, 128)).save(person_dir / "blank.png")
+    # Fails the header check / the decode
+    (person_dir / "corrupt.jpg").write_bytes(b"not an image")
+    # Shared photo without recorded faces
+    shared_dir = tmp_path / "people" / data_manager.SHARED_DIR_NAME
+    shared_dir.mkdir()
+    Image.new("RGB", (64, 64)).save(shared_dir / "unlisted.png")
+    return tmp_path / "people"
+
+
+def test_skipped_images_are_not_reprocessed(
+    tmp_path: Path,
+    people_dir: Path,
+    monkeypatch: pytest.MonkeyPatch
+) -> None:
+    _manager(tmp_path).build_database_from_images()
+    cache_mtime_ns = (tmp_path / "encodings" / "face_encodings.json").stat().st_mtime_ns
+    
+    restarted = _manager(tmp_path)
+    assert restarted.load_encodings_from_cache()
+    assert set(restarted.skipped_files) == {"Kovacs_Eva/corrupt.jpg", "_shared/unlisted.png"}
+    
+    def fail(*args: object) -> int:
+        raise AssertionError("unchanged images were processed again")
+    
+    monkeypatch.setattr(restarted, "_update_changed_images", fail)
+    assert restarted.build_database_from_images() == 0
+    assert (tmp_path / "encodings" / "face_encodings.json").stat().st_mtime_ns == cache_mtime_ns
+
+
+def test_changed_skipped_image_is_retried(tmp_path: Path, people_dir: Path) -> None:
+    _manager(tmp_path).build_database_from_images()
+    
+    corrupt = people_dir / "Kovacs_Eva" / "corrupt.jpg"
+    Image.new("RGB", (64, 64), (200, 200, 200)).save(corrupt, format="JPEG")
+    
+    restarted = _manager(tmp_path)
+    restarted.build_database_from_images()
+    
+    assert "Kovacs_Eva/corrupt.jpg" in restarted.source_files
+    assert "Kovacs_Eva/corrupt.jpg" not in restarted.skipped_files
+
+
+def _save_png(path: Path, shade: int) -> None:
+    """Save a plain image and give it a new modification time."""
+    Image.new("RGB", (64, 64), (shade, shade, shade)).save(path)
+    mtime_ns = path.stat().st_mtime_ns + shade * 1_000_000_000
+    os.utime(path, ns=(mtime_ns, mtime_ns))
+
+
+@pytest.fixture
+def encoded_paths(monkeypatch: pytest.MonkeyPatch) -> list[str]:
+    """Replace face detection and encoding: one face per image (or per recorded location)."""
+    paths: list[str] = []
+    
+    def encode_image_file(
+        image_path: Path,
+        face_locations: Optional[list[tuple[int, int, int, int]]] = None
+    ) -> list[np.ndarray]:
+        paths.append(f"{image_path.parent.name}/{image_path.name}")
+        with Image.open(image_path) as image:
+            shade = image.getpixel((0, 0))[0]
+        return [np.full(128, shade, dtype=np.float64)] * len(face_locations or [None])
+    
+    monkeypatch.setattr(data_manager, "_encode_image_file", encode_image_file)
+    return paths
+
+
+def _rows(manager: "data_manager.FaceDataManager") -> dict[str, int]:
+    """Source of every row -> shade its encoding was made from."""
+    matrix, _ = manager.get_encodings_matrix()
+    return {
+        source: int(row[0])
+        for source, row in zip(manager.known_face_sources, matrix)
+    }
+
+
+def test_update_processes_only_changed_images(tmp_path: Path, encoded_paths: list[str]) -> None:
+    people_dir = tmp_path / "people"
+    for person, filename, shade in (("Anna", "a1.png", 10), ("Anna", "a2.png", 20), ("Bela", "b1.png", 30)):
+        (people_dir / person).mkdir(parents=True, exist_ok=True)
+        _save_png(people_dir / person / filename, shade)
+    _manager(tmp_path).build_database_from_images()
+    
+    _save_png(people_dir / "Anna" / "a1.png", 40)
+    (people_dir / "Bela" / "b1.png").unlink()
+    _save_png(people_dir / "Bela" / "b2.png", 50)
+    encoded_paths.clear()
+    
+    restarted = _manager(tmp_path)
+    assert restarted.build_database_from_images() == 3
+    
+    assert sorted(encoded_paths) == ["Anna/a1.png", "Bela/b2.png"]
+    assert _rows(restarted) == {"Anna/a1.png": 40, "Anna/a2.png": 20, "Bela/b2.png": 50}
+    assert restarted.known_face_names.count("Anna") == 2
+    assert set(restarted.source_files) == {"Anna/a1.png", "Anna/a2.png", "Bela/b2.png"}
+
+
+def test_rebuild_labels_shared_photos_from_metadata(tmp_path: Path, encoded_paths: list[str]) -> None:
+    manager = _manager(tmp_path)
+    manager.shared_dir.mkdir(parents=True)
+    _save_png(manager.shared_dir / "confirmed_1.png", 60)
+    manager.add_shared_image(
+        manager.shared_dir / "confirmed_1.png",
+        [("Anna", (0, 20, 20, 0)), ("Bela", (30, 60, 60, 30))]
+    )
+    
+    rebuilt = _manager(tmp_path)
+    rebuilt.build_database_from_images(force_rebuild=True)
+    
+    assert encoded_paths == ["_shared/confirmed_1.png"]
+    assert rebuilt.known_face_names == ["Anna", "Bela"]
+    assert rebuilt.known_face_sources == ["_shared/confirmed_1.png"] * 2
+
+
+def test_confirmed_photo_is_saved_once(tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> None:
+    manager = _manager(tmp_path)
+    manager.shared_dir.mkdir(parents=True)
+    photo = manager.shared_dir / "confirmed_1.png"
+    _save_png(photo, 70)
+    saves = []
+    monkeypatch.setattr(manager, "save_encodings_to_cache", lambda: saves.append(True))
+    version = manager.db_version
+    
+    # As app.py does once the photo is written
+    with manager.batch():
+        manager.add_encodings(["Anna", "Bela"], [np.zeros(128), np.ones(128)], photo)
+        manager.add_shared_image(photo, [("Anna", (0, 20, 20, 0)), ("Bela", (30, 60, 60, 30))])
+    
+    assert len(saves) == 1
+    assert "_shared/confirmed_1.png" in manager.source_files
+    assert manager.db_version != version
+
+
+def test_batch_saves_cache_once(tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> None:
+    manager = _manager(tmp_path)
+    saves = []
+    monkeypatch.setattr(manager, "save_encodings_to_cache", lambda: saves.append(len(manager.known_face_names)))
+    
+    with manager.batch():
+        manager.add_encoding("Anna", np.zeros(128))
+        with manager.batch():
+            manager.add_encodings(["Bela", "Cecil"], [np.ones(128), np.ones(128)])
+        manager.add_encoding("Dora", np.zeros(128))
+        assert saves == []
+    
+    # Once, when the outermost batch exits, with every face in it
+    assert saves == [4]
+    
+    manager.add_encoding("Emil", np.zeros(128))
+    assert saves == [4, 5]
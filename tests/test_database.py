@@ -0,0 +1,49 @@
+"""SQLite connection handling."""
+import sqlite3
+import threading
+from pathlib import Path
+
+import pytest
+
+from src.database import DatabaseManager
+
+
+@pytest.fixture
+def db(tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> DatabaseManager:
+    monkeypatch.delenv("DATABASE_URL", raising=False)
+    db = DatabaseManager()
+    db.sqlite_path = str(tmp_path / "app_database.db")
+    db.initialize_database()
+    return db
+
+
+def test_threads_share_one_sqlite_connection(db: DatabaseManager) -> None:
+    connections = []
+    
+    def query(index: int) -> None:
+        with db.get_connection() as conn:
+            connections.append(conn)
+        db.create_user(f"user{index}", "hash")
+    
+    # Streamlit runs every rerun on a new thread
+    threads = [threading.Thread(target=query, args=(index,)) for index in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    
+    assert len({id(conn) for conn in connections}) == 1
+    assert db.get_user("user3") is not None
+
+
+def test_close_closes_the_shared_connection(db: DatabaseManager) -> None:
+    with db.get_connection() as conn:
+        pass
+    
+    # From another thread, like the atexit handler
+    closer = threading.Thread(target=db.close)
+    closer.start()
+    closer.join()
+    
+    with pytest.raises(sqlite3.ProgrammingError):
+        conn.execute("SELECT 1")
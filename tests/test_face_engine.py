@@ -0,0 +1,46 @@
+"""Search results of the recognizer."""
+from pathlib import Path
+
+import numpy as np
+import pytest
+
+face_engine = pytest.importorskip("src.face_engine")
+
+
+class _PaddedIndex:
+    """Index that finds only the first encoding and pads the rest with -1, as HNSW may."""
+    
+    def search(self, queries: np.ndarray, k: int) -> tuple[np.ndarray, np.ndarray]:
+        indices = np.full((len(queries), k), -1, dtype=np.int64)
+        indices[:, 0] = 0
+        return np.zeros((len(queries), k), dtype=np.float32), indices
+
+
+@pytest.fixture
+def recognizer(tmp_path: Path) -> "face_engine.FaceRecognizer":
+    data_manager = face_engine.FaceDataManager()
+    data_manager.encodings_file = tmp_path / "face_encodings.npy"
+    data_manager.metadata_file = tmp_path / "face_encodings.json"
+    rng = np.random.default_rng(4)
+    data_manager.add_encodings(["A", "B", "C"], list(rng.random((3, 128))))
+    
+    recognizer = face_engine.FaceRecognizer(data_manager)
+    # The quantized path: candidates are re-ranked against the matrix
+    recognizer._index = _PaddedIndex()
+    recognizer._index_exact = False
+    return recognizer
+
+
+def test_padded_candidates_never_match(recognizer: "face_engine.FaceRecognizer") -> None:
+    # Exactly the last row: matrix[-1] would match it at distance 0
+    query = recognizer._matrix[-1].astype(np.float64)
+    
+    assert recognizer._match_faces([query]) == [None]
+
+
+def test_closest_matches_drop_padding(recognizer: "face_engine.FaceRecognizer") -> None:
+    query = recognizer._matrix[-1].astype(np.float64)
+    
+    matches = recognizer.get_closest_matches(query, top_n=3)
+    
+    assert [name for name, _ in matches] == ["A"]
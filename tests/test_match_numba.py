@@ -0,0 +1,88 @@
+"""Numba matching on the memory-mapped encodings cache."""
+from pathlib import Path
+
+import numpy as np
+import pytest
+
+match_numba = pytest.importorskip("src.match_numba")
+
+
+def _brute_force(known: np.ndarray, queries: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+    distances_sq = ((known[np.newaxis, :, :] - queries[:, np.newaxis, :]) ** 2).sum(axis=2)
+    return distances_sq.argmin(axis=1), distances_sq.min(axis=1)
+
+
+@pytest.fixture
+def mapped_encodings(tmp_path: Path) -> np.ndarray:
+    rng = np.random.default_rng(0)
+    np.save(tmp_path / "face_encodings.npy", rng.random((300, 128), dtype=np.float32))
+    # Same as load_encodings_from_cache: read-only mapping
+    return np.load(tmp_path / "face_encodings.npy", mmap_mode="r")
+
+
+def test_match_one_accepts_read_only_mmap(mapped_encodings: np.ndarray) -> None:
+    query = np.random.default_rng(1).random((1, 128), dtype=np.float32)
+    expected_index, expected_distance_sq = _brute_force(np.asarray(mapped_encodings), query)
+    
+    index, distance_sq = match_numba.match_one(mapped_encodings, query[0])
+    
+    assert index == expected_index[0]
+    assert distance_sq == pytest.approx(expected_distance_sq[0], rel=1e-4)
+
+
+def test_match_batch_accepts_read_only_mmap(mapped_encodings: np.ndarray) -> None:
+    queries = np.random.default_rng(2).random((4, 128), dtype=np.float32)
+    expected_indices, expected_distances_sq = _brute_force(np.asarray(mapped_encodings), queries)
+    indices = np.empty(len(queries), dtype=np.int64)
+    distances_sq = np.empty(len(queries), dtype=np.float32)
+    
+    match_numba.match_batch(mapped_encodings, queries, indices, distances_sq)
+    
+    np.testing.assert_array_equal(indices, expected_indices)
+    np.testing.assert_allclose(distances_sq, expected_distances_sq, rtol=1e-4)
+
+
+def test_recognizer_numba_path_after_cache_reload(tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> None:
+    face_engine = pytest.importorskip("src.face_engine")
+    from src.data_manager import FaceDataManager
+    
+    # The documented fallback: no faiss, Numba installed
+    monkeypatch.setattr(face_engine, "FAISS_AVAILABLE", False)
+    
+    rng = np.random.default_rng(3)
+    encodings = list(rng.random((5, 128)))
+    
+    writer = FaceDataManager()
+    writer.encodings_file = tmp_path / "face_encodings.npy"
+    writer.metadata_file = tmp_path / "face_encodings.json"
+    writer.add_encodings(["A", "B", "C", "D", "E"], encodings)
+    
+    # Restart: the matrix comes back as a read-only memory map
+    reader = FaceDataManager()
+    assert reader.load_encodings_from_cache(tmp_path / "face_encodings.npy")
+    recognizer = face_engine.FaceRecognizer(reader)
+    
+    assert recognizer._match_faces([encodings[2]]) == ["C"]
+    assert recognizer._match_faces([encodings[4], encodings[0]]) == ["E", "A"]
+
+
+def test_match_batch_empty_matrix_finds_nothing() -> None:
+    known = np.empty((0, 128), dtype=np.float32)
+    queries = np.ones((2, 128), dtype=np.float32)
+    indices = np.empty(2, dtype=np.int64)
+    distances_sq = np.empty(2, dtype=np.float32)
+    
+    match_numba.match_batch(known, queries, indices, distances_sq)
+    
+    np.testing.assert_array_equal(indices, [-1, -1])
+    assert np.isinf(distances_sq).all()
+
+
+def test_match_one_empty_matrix_finds_nothing() -> None:
+    index, distance_sq = match_numba.match_one(
+        np.empty((0, 128), dtype=np.float32),
+        np.ones(128, dtype=np.float32)
+    )
+    
+    assert index == -1
+    assert np.isinf(distance_sq)